@@ -0,0 +1,259 @@
+import numpy as np
+
+from scene import build_scene
+
+EPS = 1e-9
+MAX_WRAPS = 3               # separation points per cable, as many as calculate_separation_3 handles
+PATH_ITERATIONS = 2000      # maximum coordinate descent sweeps over the separation points
+PATH_TOLERANCE = 1e-14      # a path is solved once no separation point moves further in a sweep
+COMBO_BLOCK = 2 ** 15       # (cable, edge chain) combinations solved together, bounds the memory
+
+
+def get_obstacle_polyhedron(scene=None):
+    """
+    :param scene: scene built by scene.build_scene, the default scene if None
+    :return edges: ends of the obstacle edges, e x 2 x 3
+            normals: outward normals of the obstacle faces, f x 3
+            offsets: offsets of the faces, the obstacle being {x | normals @ x <= offsets}
+
+    The obstacle is the convex polyhedron spanned by the vertices used by the wrapping solver:
+    a box from Ob1 - Ob4 to Om1 - Om4 with a pyramid roof up to Ot.
+    """
+    scene = build_scene() if scene is None else scene
+    Ob = [scene['Ob{}'.format(i + 1)] for i in range(4)]
+    Om = [scene['Om{}'.format(i + 1)] for i in range(4)]
+    Ot = scene['Ot']
+
+    edges = []
+    faces = [Ob]
+    for i in range(4):
+        j = (i + 1) % 4
+        edges += [(Ob[i], Ob[j]), (Ob[i], Om[i]), (Om[i], Om[j]), (Om[i], Ot)]
+        faces += [(Ob[i], Ob[j], Om[j], Om[i]), (Om[i], Om[j], Ot)]
+
+    center = np.mean(Ob + Om + [Ot], axis=0)
+    normals = []
+    offsets = []
+    for face in faces:
+        normal = np.cross(face[1] - face[0], face[2] - face[0])
+        normal /= np.linalg.norm(normal)
+        if np.dot(normal, center - face[0]) > 0:
+            normal = -normal
+        normals.append(normal)
+        offsets.append(np.dot(normal, face[0]))
+
+    return np.array(edges), np.array(normals), np.array(offsets)
+
+
+def check_inside_polyhedron(points, normals, offsets):
+    """
+    :param points: points to be checked, ... x 3
+    :param normals: outward normals of the faces of a convex polyhedron, f x 3
+    :param offsets: offsets of the faces, ... x f or f
+    :return: whether each point is in the interior of the polyhedron, the boundary is outside
+    """
+    return np.all(points @ normals.T < offsets - EPS, axis=-1)
+
+
+def check_segment_penetration(starts, ends, normals, offsets):
+    """
+    :param starts: starts of the segments, ... x 3
+    :param ends: ends of the segments, ... x 3
+    :param normals: outward normals of the faces of a convex polyhedron, f x 3
+    :param offsets: offsets of the faces
+    :return: whether each segment passes through the interior of the polyhedron, touching is not penetrating
+    """
+    vectors = ends - starts
+    depths = offsets - starts @ normals.T       # ... x f, positive on the inner side of the face
+    speeds = vectors @ normals.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = depths / speeds
+    s_enter = np.max(np.where(speeds < -EPS, ratios, 0), axis=-1, initial=0)
+    s_exit = np.min(np.where(speeds > EPS, ratios, 1), axis=-1, initial=1)
+    parallel_outside = np.any((np.abs(speeds) <= EPS) & (depths <= EPS), axis=-1)
+    return ~parallel_outside & ((s_exit - s_enter) * np.linalg.norm(vectors, axis=-1) > EPS)
+
+
+def get_edge_faces(edges, normals, offsets):
+    """
+    :return: whether each edge lies on each face, e x f
+    """
+    return np.all(np.abs(edges @ normals.T - offsets) < 1e-9, axis=1)
+
+
+def get_edge_chains(edges, normals, offsets):
+    """
+    :return: every sequence of at most MAX_WRAPS distinct edges a cable can wrap around, c x MAX_WRAPS,
+             padded with -1 and ordered by the number of edges, the empty sequence first
+
+    A taut cable leaves a convex obstacle for good once it leaves its surface, so consecutive edges share a face.
+    Edges on the bottom face are left out, since the obstacle stands on the floor.
+    """
+    edge_faces = get_edge_faces(edges, normals, offsets)
+    on_floor = np.any(edge_faces[:, normals[:, 2] < -1 + EPS], axis=-1)
+    adjacent = (edge_faces.astype(int) @ edge_faces.T.astype(int) > 0) & ~on_floor & ~on_floor[:, None]
+
+    chains = [()]
+    frontier = [(edge,) for edge in np.flatnonzero(~on_floor)]
+    while frontier:
+        chains += frontier
+        frontier = [chain + (edge,) for chain in frontier if len(chain) < MAX_WRAPS
+                    for edge in np.flatnonzero(adjacent[chain[-1]]) if edge not in chain]
+
+    table = np.full((len(chains), MAX_WRAPS), -1)
+    for index, chain in enumerate(chains):
+        table[index, :len(chain)] = chain
+    return table
+
+
+def minimize_on_edge(Ppoint, Qpoint, Epoint1, Epoint2):
+    """
+    :return: the point S on the edge from Epoint1 to Epoint2 minimizing |P - S| + |S - Q|, found by unfolding
+    """
+    length = np.linalg.norm(Epoint2 - Epoint1, axis=-1, keepdims=True)
+    axis = (Epoint2 - Epoint1) / length
+    p = np.sum((Ppoint - Epoint1) * axis, axis=-1, keepdims=True)
+    q = np.sum((Qpoint - Epoint1) * axis, axis=-1, keepdims=True)
+    dp = np.linalg.norm(Ppoint - Epoint1 - p * axis, axis=-1, keepdims=True)
+    dq = np.linalg.norm(Qpoint - Epoint1 - q * axis, axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(dp + dq > EPS, p + (q - p) * dp / (dp + dq), p)
+    return Epoint1 + np.clip(s, 0, length) * axis
+
+
+def get_path_nodes(Apoints, Bpoints, points, wrap_count):
+    """
+    :return: anchor, separation points and platform of each path, ... x (w + 2) x 3, padded with the platform
+    """
+    active = np.arange(points.shape[-2]) < wrap_count[..., None]
+    points = np.where(active[..., None], points, Bpoints[..., None, :])
+    return np.concatenate((Apoints[..., None, :], points, Bpoints[..., None, :]), axis=-2)
+
+
+def solve_edge_chains(Apoints, Bpoints, edge_ends, wrap_count):
+    """
+    :param Apoints: fixed ends of the cables, k x 3
+    :param Bpoints: free ends of the cables, k x 3
+    :param edge_ends: ends of the edges the cables wrap around in order, k x w x 2 x 3
+    :param wrap_count: number of edges of each chain, k
+    :return: separation points of the shortest paths over the edges, k x w x 3
+
+    The path length is convex in the positions of the separation points along their edges, so the coordinate
+    descent, which moves one point at a time to its optimum by unfolding, converges to the shortest path.
+    """
+    wrap_num = edge_ends.shape[1]
+    points = edge_ends.mean(axis=2)
+    todo = np.flatnonzero(wrap_count > 0)
+    for _ in range(PATH_ITERATIONS):
+        if not todo.size:
+            break
+        A, B, ends, count = Apoints[todo], Bpoints[todo], edge_ends[todo], wrap_count[todo, None]
+        current = points[todo]
+        previous = current.copy()
+        for j in range(wrap_num):
+            before = A if j == 0 else current[:, j - 1]
+            after = np.where(j + 1 < count, current[:, min(j + 1, wrap_num - 1)], B)
+            solved = minimize_on_edge(before, after, ends[:, j, 0], ends[:, j, 1])
+            current[:, j] = np.where(j < count, solved, current[:, j])
+        points[todo] = current
+        todo = todo[np.max(np.abs(current - previous), axis=(1, 2)) > PATH_TOLERANCE]
+    return points
+
+
+def get_path_residuals(Apoints, Bpoints, edge_ends, points, wrap_count):
+    """
+    :return: violation of the optimality condition of each separation point along its edge, ... x w,
+             0 for padding and inf where two consecutive nodes of the path coincide
+    """
+    nodes = get_path_nodes(Apoints, Bpoints, points, wrap_count)
+    incoming = nodes[..., 1:-1, :] - nodes[..., :-2, :]
+    outgoing = nodes[..., 2:, :] - nodes[..., 1:-1, :]
+    incoming_norm = np.linalg.norm(incoming, axis=-1)
+    outgoing_norm = np.linalg.norm(outgoing, axis=-1)
+    axis = edge_ends[..., 1, :] - edge_ends[..., 0, :]
+    length = np.linalg.norm(axis, axis=-1)
+    position = np.sum((points - edge_ends[..., 0, :]) * axis, axis=-1) / length
+    axis = axis / length[..., None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # derivative of the path length with respect to the position of the point along the edge
+        slope = np.sum(incoming * axis, axis=-1) / incoming_norm - np.sum(outgoing * axis, axis=-1) / outgoing_norm
+    residuals = np.where(position <= EPS, np.clip(-slope, 0, None),
+                         np.where(position >= length - EPS, np.clip(slope, 0, None), np.abs(slope)))
+    residuals = np.where((incoming_norm > EPS) & (outgoing_norm > EPS), residuals, np.inf)
+    return np.where(np.arange(points.shape[-2]) < wrap_count[..., None], residuals, 0)
+
+
+def solve_cable_paths(anchors, poses, scene=None):
+    """
+    :param anchors: fixed ends of the cables, n x 3
+    :param poses: positions of the platform, p x 3
+    :param scene: scene built by scene.build_scene, the default scene if None
+    :return lengths: lengths of the taut cables, p x n, nan inside the obstacle or where no path is found
+            path_edges: edge of each separation point, p x n x MAX_WRAPS, -1 for padding
+            path_points: separation points, p x n x MAX_WRAPS x 3
+            residuals: largest optimality residual of the separation points of each cable, p x n
+
+    Each cable is solved from its own anchor: a cable whose straight segment passes through the obstacle takes
+    the shortest path over a chain of obstacle edges which does not pass through it, so the cable is taut and
+    leaves the obstacle at its last separation point.
+    """
+    scene = build_scene() if scene is None else scene
+    anchors = np.asarray(anchors, dtype=float)
+    poses = np.asarray(poses, dtype=float).reshape(-1, 3)
+    edges, normals, offsets = get_obstacle_polyhedron(scene)
+    chains = get_edge_chains(edges, normals, offsets)
+    chain_wraps = np.sum(chains >= 0, axis=-1)
+    edge_faces = get_edge_faces(edges, normals, offsets).astype(int)
+
+    shape = (poses.shape[0], anchors.shape[0])
+    Apoints = np.broadcast_to(anchors, shape + (3,))
+    Bpoints = np.broadcast_to(poses[:, None, :], shape + (3,))
+    inside = check_inside_polyhedron(poses, normals, offsets)
+    lengths = np.linalg.norm(Apoints - Bpoints, axis=-1)
+    lengths[inside] = np.nan
+    path_edges = np.full(shape + (MAX_WRAPS,), -1)
+    path_points = np.zeros(shape + (MAX_WRAPS, 3))
+    residuals = np.zeros(shape)
+
+    blocked = check_segment_penetration(Apoints, Bpoints, normals, offsets) & ~inside[:, None]
+    A, B = Apoints[blocked], Bpoints[blocked]
+    if not A.shape[0]:
+        return lengths, path_edges, path_points, residuals
+
+    # a cable can only reach an edge from a point which sees one of the faces of the edge
+    def get_visible_edges(points):
+        return (points @ normals.T - offsets >= -EPS).astype(int) @ edge_faces.T > 0
+
+    first = chains[:, 0]
+    last = chains[np.arange(chains.shape[0]), np.clip(chain_wraps - 1, 0, None)]
+    candidates = get_visible_edges(A)[:, first] & get_visible_edges(B)[:, last] & (chain_wraps > 0)
+    pair_index, chain_index = np.nonzero(candidates)
+
+    scores = np.full(pair_index.shape[0], np.inf)
+    points = np.zeros((pair_index.shape[0], MAX_WRAPS, 3))
+    for start in range(0, pair_index.shape[0], COMBO_BLOCK):
+        block = slice(start, start + COMBO_BLOCK)
+        pairs, wraps = pair_index[block], chain_wraps[chain_index[block]]
+        edge_ends = edges[np.clip(chains[chain_index[block]], 0, None)]
+        points[block] = solve_edge_chains(A[pairs], B[pairs], edge_ends, wraps)
+        nodes = get_path_nodes(A[pairs], B[pairs], points[block], wraps)
+        valid = ~np.any(check_segment_penetration(nodes[:, :-1], nodes[:, 1:], normals, offsets), axis=-1)
+        scores[block] = np.where(valid, np.linalg.norm(np.diff(nodes, axis=1), axis=-1).sum(axis=-1), np.inf)
+
+    # the shortest valid path of each cable, the one over the fewest edges among equally short ones
+    best = np.full(A.shape[0], np.inf)
+    np.minimum.at(best, pair_index, scores)
+    chosen = np.flatnonzero(np.isfinite(scores) & (scores <= best[pair_index] + 1e-12))
+    solved, first_chosen = np.unique(pair_index[chosen], return_index=True)
+    picks = chosen[first_chosen]
+
+    cables = tuple(index[solved] for index in np.nonzero(blocked))
+    lengths[blocked] = np.nan
+    residuals[blocked] = np.inf
+    lengths[cables] = scores[picks]
+    path_edges[cables] = chains[chain_index[picks]]
+    path_points[cables] = points[picks]
+    residuals[cables] = np.max(get_path_residuals(A[solved], B[solved], edges[np.clip(path_edges[cables], 0, None)],
+                                                  points[picks], chain_wraps[chain_index[picks]]), axis=-1)
+    return lengths, path_edges, path_points, residuals
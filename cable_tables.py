@@ -0,0 +1,242 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from cable_paths import check_inside_polyhedron, get_obstacle_polyhedron, solve_cable_paths
+from scene import build_scene, load_config
+from sweep import BLOCK_SIZE, get_definition, get_positions
+
+RESIDUAL_TOLERANCE = 1e-9       # largest optimality residual of the separation points in certified cells
+
+
+def evaluate_cable_geometry(positions, scene_config=None):
+    """
+    :param positions: positions of the platform, p x 3
+    :param scene_config: scene parameters as in scene.DEFAULT_SCENE, the default scene if None
+    :return lengths: exact cable lengths, wrapped around the obstacle where needed, p x n (nan inside the obstacle)
+            gradients: gradients of the cable lengths with respect to the platform position, p x n x 3
+            free_lengths: lengths of the free segments, from the last separation point (or the anchor), p x n
+            wrappings: code of the obstacle edges each cable wraps around, 0 for a straight cable, p x n
+            residuals: optimality residuals of the separation points, see cable_paths.solve_cable_paths, p x n
+
+    The wrapped cable is the shortest path over the obstacle edges, so its length only changes through the free
+    segment: the gradient is the unit vector from the last separation point (or the anchor) to the platform.
+    This only holds where the separation points are optimal, namely where the residual vanishes.
+    """
+    scene = build_scene(scene_config)
+    anchors = np.stack(scene['A_list'])
+    lengths, path_edges, path_points, residuals = solve_cable_paths(anchors, positions, scene)
+    edge_num = get_obstacle_polyhedron(scene)[0].shape[0]
+
+    wrap_count = np.sum(path_edges >= 0, axis=-1)
+    last = np.take_along_axis(path_points, np.clip(wrap_count - 1, 0, None)[..., None, None], axis=-2)[..., 0, :]
+    starts = np.where(wrap_count[..., None] > 0, last, anchors)
+    wrappings = np.sum((path_edges + 1) * (edge_num + 1) ** np.arange(path_edges.shape[-1]), axis=-1)
+
+    vectors = positions[:, None, :] - starts
+    free_lengths = np.linalg.norm(vectors, axis=-1)
+    gradients = vectors / free_lengths[..., None]
+    gradients[np.isnan(lengths)] = np.nan
+    return lengths, gradients, free_lengths, wrappings, residuals
+
+
+def evaluate_in_parallel(positions, scene_config, worker_num=None):
+    """
+    :return: evaluate_cable_geometry over a large set of positions, split over a process pool
+    """
+    worker_num = worker_num or os.cpu_count()
+    block_num = max(-(-positions.shape[0] // BLOCK_SIZE), 4 * worker_num)
+    blocks = np.array_split(positions, max(min(block_num, positions.shape[0]), 1))
+    if worker_num == 1:
+        results = [evaluate_cable_geometry(block, scene_config) for block in blocks]
+    else:
+        with ProcessPoolExecutor(worker_num) as executor:
+            results = list(executor.map(partial(evaluate_cable_geometry, scene_config=scene_config), blocks))
+    return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+
+def interpolate_grid(origin, step, values, poses):
+    """
+    :param origin: position of the first grid point
+    :param step: grid spacing along x, y and z
+    :param values: values at the grid points, x_num x y_num x z_num x ...
+    :param poses: positions to look up, p x 3
+    :return: trilinear interpolation of the values, p x ..., nan outside the grid
+    """
+    shape = np.array(values.shape[:3])
+    fractions = (poses - origin) / step
+    lower = np.clip(np.floor(fractions).astype(int), 0, shape - 2)
+    weights = fractions - lower
+    outside = np.any((fractions < -1e-9) | (fractions > shape - 1 + 1e-9), axis=-1)
+
+    result = 0
+    for corner in np.ndindex(2, 2, 2):
+        index = lower + corner
+        weight = np.prod(np.where(corner, weights, 1 - weights), axis=-1)
+        weight = weight.reshape(weight.shape + (1,) * (values.ndim - 3))
+        result = result + weight * values[index[:, 0], index[:, 1], index[:, 2]]
+    result = np.asarray(result, dtype=float)
+    result[outside] = np.nan
+    return result
+
+
+def generate_cable_tables(config, worker_num=None):
+    """
+    :param config: sweep configuration, see scene.load_config, only the scene and the grid are used
+    :param worker_num: number of worker processes, os.cpu_count() if None
+    :return: dictionary with the grid 'origin' and 'step', the tables 'lengths' (x_num x y_num x z_num x n)
+             and 'gradients' (x_num x y_num x z_num x n x 3), and their certificates, see certify_cable_tables
+    """
+    definition = get_definition(config)
+    positions = get_positions(definition)
+    grid = positions.shape[:3]
+
+    lengths, gradients, free_lengths, wrappings, residuals = evaluate_in_parallel(positions.reshape(-1, 3),
+                                                                                  definition['scene'], worker_num)
+    table = {
+        'origin': positions[0, 0, 0],
+        'step': positions[1, 1, 1] - positions[0, 0, 0],
+        'lengths': lengths.reshape(grid + lengths.shape[1:]),
+        'gradients': gradients.reshape(grid + gradients.shape[1:]),
+        'free_lengths': free_lengths.reshape(grid + free_lengths.shape[1:]),
+        'wrappings': wrappings.reshape(grid + wrappings.shape[1:]),
+        'residuals': residuals.reshape(grid + residuals.shape[1:]),
+    }
+    _, table['normals'], table['offsets'] = get_obstacle_polyhedron(build_scene(definition['scene']))
+    table.update(certify_cable_tables(table, definition['scene'], worker_num))
+    return table
+
+
+def get_cell_corners(values):
+    """
+    :param values: values at the grid points, x_num x y_num x z_num x ...
+    :return: values at the 8 corners of every cell, 8 x (x_num - 1) x (y_num - 1) x (z_num - 1) x ...
+    """
+    return np.stack([values[i:values.shape[0] - 1 + i, j:values.shape[1] - 1 + j, k:values.shape[2] - 1 + k]
+                     for i, j, k in np.ndindex(2, 2, 2)])
+
+
+def get_cell_centers(origin, step, cell_shape):
+    return origin + step * (np.stack(np.meshgrid(*[np.arange(n) for n in cell_shape], indexing='ij'), axis=-1) + 0.5)
+
+
+def get_obstacle_cells(origin, step, cell_shape, scene_config=None):
+    """
+    :return: whether each cell of the grid intersects the obstacle, touching included, x_num - 1 x y_num - 1 x z_num - 1
+
+    Separating axis test of every cell box against the obstacle polyhedron, over the box axes, the face normals
+    and the cross products of the box axes with the obstacle edges.
+    """
+    edges, normals, _ = get_obstacle_polyhedron(build_scene(scene_config))
+    vertices = edges.reshape(-1, 3)
+    crossed = np.cross(np.eye(3)[:, None, :], edges[None, :, 1] - edges[None, :, 0]).reshape(-1, 3)
+    axes = np.concatenate((np.eye(3), normals, crossed[np.linalg.norm(crossed, axis=-1) > 1e-12]))
+
+    centers = get_cell_centers(origin, step, cell_shape)
+    projections = centers @ axes.T
+    radii = np.abs(axes) @ (step / 2)
+    vertex_projections = vertices @ axes.T
+    separated = (projections + radii < vertex_projections.min(axis=0)) | \
+                (projections - radii > vertex_projections.max(axis=0))
+    return ~np.any(separated, axis=-1)
+
+
+def certify_cable_tables(table, scene_config=None, worker_num=None):
+    """
+    :return: dictionary with the per-cell error bounds of the lengths 'length_errors' and of the gradients
+             'gradient_errors', (x_num - 1) x (y_num - 1) x (z_num - 1) x n
+
+    Where a cable wraps around the same edges at the 8 corners of a cell, its length is a convex function of the
+    platform position whose Hessian norm is at most 1 / r, r being the length of the free segment. The trilinear
+    interpolation error is then at most (hx^2 + hy^2 + hz^2) / (8 r_min), with r_min bounded from the corners.
+    The interpolated gradient is a weighted mean of the corner gradients, which differ from the exact one by at
+    most 1 / r_min times the distance to the corner, and the weighted distance to the corners is at most half the
+    cell diagonal, hence a gradient error of at most |h| / (2 r_min).
+    Cells where the wrapping changes, which touch the obstacle, or where a separation point at a corner is not
+    optimal (so that the gradient does not hold there), get infinite bounds. The bounds are raised to the errors
+    measured against exact evaluation at the cell centre, in case the wrapping changes inside the cell.
+    """
+    origin, step = table['origin'], table['step']
+    cell_shape = tuple(np.array(table['lengths'].shape[:3]) - 1)
+
+    wrappings = get_cell_corners(table['wrappings'])
+    corner_lengths = get_cell_corners(table['lengths'])
+    same_wrapping = np.all(wrappings == wrappings[0], axis=0) & ~np.any(np.isnan(corner_lengths), axis=0)
+    same_wrapping &= np.all(get_cell_corners(table['residuals']) <= RESIDUAL_TOLERANCE, axis=0)
+    same_wrapping &= ~get_obstacle_cells(origin, step, cell_shape, scene_config)[..., None]
+    r_min = np.min(get_cell_corners(table['free_lengths']), axis=0) - np.linalg.norm(step) / 2
+    certified = same_wrapping & (r_min > 0)
+    with np.errstate(divide='ignore'):
+        length_bounds = np.where(certified, np.sum(step ** 2) / (8 * r_min), np.inf)
+        gradient_bounds = np.where(certified, np.linalg.norm(step) / (2 * r_min), np.inf)
+
+    centers = get_cell_centers(origin, step, cell_shape).reshape(-1, 3)
+    lengths, gradients, _, _, _ = evaluate_in_parallel(centers, scene_config, worker_num)
+    length_errors = np.abs(interpolate_grid(origin, step, table['lengths'], centers) - lengths)
+    gradient_errors = np.linalg.norm(interpolate_grid(origin, step, table['gradients'], centers) - gradients, axis=-1)
+
+    length_errors = length_errors.reshape(length_bounds.shape)
+    gradient_errors = gradient_errors.reshape(gradient_bounds.shape)
+    length_bounds = np.where(np.isnan(length_errors), np.inf, np.maximum(length_bounds, length_errors))
+    gradient_bounds = np.where(np.isnan(gradient_errors), np.inf, np.maximum(gradient_bounds, gradient_errors))
+    return {'length_errors': length_bounds, 'gradient_errors': gradient_bounds}
+
+
+def lookup_cable_lengths(table, poses):
+    """
+    :param table: cable tables, as generated by generate_cable_tables or loaded by load_cable_tables
+    :param poses: positions of the platform, p x 3
+    :return lengths: interpolated cable lengths, p x n
+            gradients: interpolated length gradients, namely the rows of the inverse Jacobian, p x n x 3
+            length_errors: length error bound of the cell of each pose, inf where it is not certified, p x n
+            gradient_errors: gradient error bound of the cell of each pose, inf where it is not certified, p x n
+            (all nan inside the obstacle)
+    """
+    poses = np.asarray(poses, dtype=float).reshape(-1, 3)
+    origin, step = table['origin'], table['step']
+    lengths = interpolate_grid(origin, step, table['lengths'], poses)
+    gradients = interpolate_grid(origin, step, table['gradients'], poses)
+
+    cell_shape = np.array(table['length_errors'].shape[:3])
+    cells = np.clip(np.floor((poses - origin) / step).astype(int), 0, cell_shape - 1)
+    length_errors = table['length_errors'][cells[:, 0], cells[:, 1], cells[:, 2]]
+    gradient_errors = table['gradient_errors'][cells[:, 0], cells[:, 1], cells[:, 2]]
+    inside = check_inside_polyhedron(poses, table['normals'], table['offsets'])
+    lengths[inside] = np.nan
+    gradients[inside] = np.nan
+    length_errors[np.isnan(lengths)] = np.nan
+    gradient_errors[np.isnan(lengths)] = np.nan
+    return lengths, gradients, length_errors, gradient_errors
+
+
+def save_cable_tables(path, table):
+    np.savez(path, **table)
+
+
+def load_cable_tables(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='generate wrap-aware cable length and gradient tables')
+    parser.add_argument('config', nargs='?', default=None, help='json file overriding the default configuration')
+    parser.add_argument('--grid', type=int, nargs=3, default=None, metavar=('X_NUM', 'Y_NUM', 'Z_NUM'))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='cable_tables.npz')
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.grid is not None:
+        config['grid'] = args.grid
+
+    table = generate_cable_tables(config, args.workers or config['workers'])
+    save_cable_tables(args.output, table)
+    certified = np.isfinite(table['length_errors'])
+    print('{}: {:.1%} of the cells certified, max length error bound {:.3g} m and gradient error bound {:.3g} '
+          'over them'.format(args.output, certified.mean(), table['length_errors'][certified].max(initial=0),
+                             table['gradient_errors'][certified].max(initial=0)))
@@ -1,6 +1,4 @@
 import numpy as np
-from matplotlib import pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 
 
 def rotate_point(point, Cpoint1, Cpoint2, theta):
@@ -415,6 +413,9 @@ def calculate_cable_length(Apoint, separations, Bpoint):
 
 
 if __name__ == "__main__":
+    from matplotlib import pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D
+
     # A = np.array([-1, 0, 1])
     # B = np.array([1, -1, 0])
     # C = np.array([1, 1, 0])
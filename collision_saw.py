@@ -1,17 +1,23 @@
 import numpy as np
-import scipy.io
-from calculate_separation_v1 import calculate_separation_1, calculate_separation_2, calculate_separation_3
-from hyperplane_shifting import calculate_static_raw
+from cable_paths import check_inside_polyhedron, check_segment_penetration, get_obstacle_polyhedron, solve_cable_paths
+from calculate_separation_v1 import calculate_cable_length, calculate_separation_1, calculate_separation_2, \
+    calculate_separation_3
+from hyperplane_shifting import calculate_static_raw, get_structure_matrix
+from scene import build_scene
 
-def check_inside(pos):
-    middle_level = 0.172
-    center_x = 0.249
-    center_y = 0.1515
-    Ot = np.array([center_x, center_y, 0.337]) - np.array([center_x, center_y, 0])
-    Ob1 = np.array([0.362, 0.264, 0.000]) - np.array([center_x, center_y, 0])
-    Ob2 = np.array([0.136, 0.264, 0.000]) - np.array([center_x, center_y, 0])
-    Ob3 = np.array([0.136, 0.039, 0.000]) - np.array([center_x, center_y, 0])
+SCENE = build_scene()
+A1, A2, A3, A4 = A_list = SCENE['A_list']
+Ot = SCENE['Ot']
+Om1, Om2, Om3, Om4 = SCENE['Om1'], SCENE['Om2'], SCENE['Om3'], SCENE['Om4']
+Ob1, Ob2, Ob3, Ob4 = SCENE['Ob1'], SCENE['Ob2'], SCENE['Ob3'], SCENE['Ob4']
+middle_level = Om1[2]
+
+# the eight symmetries of the square frame, acting on the x-y plane
+SYMMETRIES = [np.diag([sx, sy, 1]) for sx in (1, -1) for sy in (1, -1)] + \
+             [np.array([[0, sx, 0], [sy, 0, 0], [0, 0, 1]]) for sx in (1, -1) for sy in (1, -1)]
 
+
+def check_inside(pos):
     if ((Ob2[0] < pos[0]) and (pos[0] < Ob1[0]) and (Ob3[1] < pos[1]) and (
             pos[1] < Ob1[1]) and (0 < pos[2]) and (pos[2] < middle_level)) or (
             ((middle_level < pos[2]) and (pos[2] < Ot[2])) and (
@@ -28,12 +34,6 @@ def check_inside(pos):
 def check_collision(pos):
     is_coll = False
 
-    A1 = np.array([0.342, 0.342, 0.727])
-    A2 = np.array([-0.342, 0.342, 0.727])
-    A3 = np.array([-0.342, -0.342, 0.727])
-    A4 = np.array([0.342, -0.342, 0.727])
-    A_list = [A1, A2, A3, A4]
-
     for cable_index in range(4):
         if not is_coll:
             for i in range(100):
@@ -45,25 +45,156 @@ def check_collision(pos):
     return is_coll
 
 
-if __name__ == "__main__":
+def check_inside_batch(points, scene=None):
+    """
+    :param points: points to be checked, ... x 3
+    :param scene: scene built by scene.build_scene, SCENE if None
+    :return: whether each point is inside the obstacle, same rule as check_inside
+    """
+    scene = SCENE if scene is None else scene
+    Ot, Ob1, Ob2, Ob3, middle_level = scene['Ot'], scene['Ob1'], scene['Ob2'], scene['Ob3'], scene['Om1'][2]
+
+    x, y, z = points[..., 0], points[..., 1], points[..., 2]
+    in_column = (Ob2[0] < x) & (x < Ob1[0])
+    in_base = in_column & (Ob3[1] < y) & (y < Ob1[1]) & (0 < z) & (z < middle_level)
+    in_top = (middle_level < z) & (z < Ot[2]) & in_column & \
+             (Ob3[1] / Ob1[0] * np.abs(x) < y) & (y < Ob1[1] / Ob1[0] * np.abs(x))
+    return in_base | in_top
+
+
+def check_collision_batch(poses, sample_num=100, scene=None):
+    """
+    :param poses: positions of the platform, p x 3
+    :param sample_num: number of samples along each straight cable
+    :param scene: scene built by scene.build_scene, SCENE if None
+    :return: whether any straight cable passes through the obstacle for each pose, same rule as check_collision
+    """
+    scene = SCENE if scene is None else scene
+    poses = np.asarray(poses, dtype=float).reshape(-1, 3)
+    ratios = np.arange(sample_num)[:, None]
+    vectors = np.stack(scene['A_list'])[None, :, None, :] - poses[:, None, None, :]
+    check_points = poses[:, None, None, :] + vectors / sample_num * ratios
+    return check_inside_batch(check_points, scene).any(axis=(1, 2))
+
+
+def calculate_wrapped_raw(pos, t_min=0, t_max=50, m=1, scene=None):
+    """
+    :param pos: position of the platform, in the region x < 0 and -x <= y
+    :param t_min: minimum cable tension
+    :param t_max: maximum cable tension
+    :param m: mass of the platform
+    :param scene: scene built by scene.build_scene, SCENE if None
+    :return raw: the best radius of the available wrench over the candidate wrapping configurations
+            separations: separation points of each cable in the best configuration, the anchor if straight
+    """
+    scene = SCENE if scene is None else scene
+    A1, A2, A3, A4 = scene['A_list']
+    Ot, Om1, Om2, Om3, Ob2 = scene['Ot'], scene['Om1'], scene['Om2'], scene['Om3'], scene['Ob2']
+
+    seps31, _ = calculate_separation_2(A3, pos, Ot, Om1, Om2, 3)
+    seps41, _ = calculate_separation_2(A4, pos, Om1, Om2, Ot, 1)
+    seps42, _ = calculate_separation_3(A3, pos, Ot, Om2, Ob2, Om3, 4)
+    seps34, _ = calculate_separation_1(A3, pos, Om2, Ob2)
+
+    configurations = [
+        [A1.reshape(-1, 3), A2.reshape(-1, 3), seps31, seps41],
+        [A1.reshape(-1, 3), A2.reshape(-1, 3), A3.reshape(-1, 3), seps42],
+        [A1.reshape(-1, 3), A2.reshape(-1, 3), A3.reshape(-1, 3), seps31],
+        [A1.reshape(-1, 3), A2.reshape(-1, 3), seps34, seps41],
+    ]
+
+    raw_list = []
+    for separations in configurations:
+        J = np.vstack([seps[-1, :] - pos for seps in separations])
+        raw_list.append(calculate_static_raw(J.T, t_min, t_max, m))
+
+    best = int(np.argmax(raw_list))
+    return raw_list[best], configurations[best]
+
+
+def get_symmetry(pos, scene=None):
+    """
+    :param pos: position of the platform
+    :param scene: scene built by scene.build_scene, SCENE if None
+    :return T: symmetry of the frame mapping pos into the region x <= 0 and -x <= y
+            perm: perm[i] is the cable whose anchor cable i is mapped onto by T
+    """
+    A_list = (SCENE if scene is None else scene)['A_list']
+    for T in SYMMETRIES:
+        mapped = T @ pos
+        if mapped[0] <= 0 and -mapped[0] <= mapped[1]:
+            perm = [int(np.argmin([np.linalg.norm(T @ A - B) for B in A_list])) for A in A_list]
+            return T, perm
+
+
+def evaluate_poses(poses, t_min=0, t_max=50, m=1, scene=None):
+    """
+    :param poses: positions of the platform, p x 3
+    :param t_min: minimum cable tension
+    :param t_max: maximum cable tension
+    :param m: mass of the platform
+    :param scene: scene built by scene.build_scene, SCENE if None
+    :return: dictionary with, for each pose,
+             'inside': whether the platform is inside the obstacle, same rule as check_inside
+             'collision': whether any straight cable passes through the obstacle, same rule as check_collision
+             'raw': radius of the available wrench, with wrapped cables where the straight ones collide
+             'raw_separations': separation points of each cable in the configuration the raw is evaluated with
+             'path_inside': whether the platform is inside the obstacle polyhedron
+             'path_collision': whether any straight cable passes through the obstacle polyhedron
+             'lengths': lengths of the taut cables, nan inside the obstacle polyhedron or where no path is found
+             'separations': separation points of each cable, empty for straight cables
+
+    The fields come in two groups, each with its own obstacle model. 'inside', 'collision', 'raw' and
+    'raw_separations' follow the sweeps, so that the raw matches raw.mat and raw_add.mat: the obstacle is the
+    region of check_inside and the wrapped raw is the best one over the candidate configurations of
+    calculate_wrapped_raw, which are not always physical cable paths. 'path_inside', 'path_collision', 'lengths'
+    and 'separations' follow the obstacle polyhedron of cable_paths.get_obstacle_polyhedron: the separations are
+    the shortest paths of each cable from its own anchor around it, see cable_paths.solve_cable_paths.
+    """
+    scene = SCENE if scene is None else scene
+    anchors = np.stack(scene['A_list'])
+    poses = np.asarray(poses, dtype=float).reshape(-1, 3)
+    pose_num = poses.shape[0]
+    inside = check_inside_batch(poses, scene)
+    collision = check_collision_batch(poses, scene=scene)
+
+    raw = np.zeros(pose_num)
+    raw_separations = [[np.empty((0, 3)) for _ in anchors] for _ in range(pose_num)]
+
+    free = ~collision
+    if free.any():
+        raw[free] = calculate_static_raw(get_structure_matrix(anchors, poses[free]), t_min, t_max, m)
+
+    for index in np.flatnonzero(collision & ~inside):
+        pos = poses[index]
+        T, perm = get_symmetry(pos, scene)
+        raw[index], wrapped = calculate_wrapped_raw(T @ pos, t_min, t_max, m, scene)
+        for cable_index, A in enumerate(anchors):
+            seps = wrapped[perm[cable_index]] @ T      # T is orthogonal, so this maps back with T^-1
+            raw_separations[index][cable_index] = seps[np.linalg.norm(seps - A, axis=1) > 1e-9]
+
+    _, normals, offsets = get_obstacle_polyhedron(scene)
+    path_inside = check_inside_polyhedron(poses, normals, offsets)
+    ends = np.broadcast_to(poses[:, None, :], (pose_num,) + anchors.shape)
+    starts = np.broadcast_to(anchors, ends.shape)
+    path_collision = check_segment_penetration(starts, ends, normals, offsets).any(axis=-1) & ~path_inside
+
+    solved_lengths, path_edges, path_points, _ = solve_cable_paths(anchors, poses, scene)
+    wrap_count = np.sum(path_edges >= 0, axis=-1)
+    separations = [[points[:count] for points, count in zip(cables, counts)]
+                   for cables, counts in zip(path_points, wrap_count)]
+    lengths = np.full((pose_num, anchors.shape[0]), np.nan)
+    for index, cable_index in zip(*np.nonzero(~np.isnan(solved_lengths))):
+        lengths[index, cable_index] = calculate_cable_length(anchors[cable_index],
+                                                             separations[index][cable_index], poses[index])
+
+    return {'inside': inside, 'collision': collision, 'raw': raw, 'raw_separations': raw_separations,
+            'path_inside': path_inside, 'path_collision': path_collision, 'lengths': lengths,
+            'separations': separations}
 
-    A1 = np.array([0.342, 0.342, 0.727])
-    A2 = np.array([-0.342, 0.342, 0.727])
-    A3 = np.array([-0.342, -0.342, 0.727])
-    A4 = np.array([0.342, -0.342, 0.727])
-
-    middle_level = 0.172
-    center_x = 0.249
-    center_y = 0.1515
-    Ot = np.array([center_x, center_y, 0.337]) - np.array([center_x, center_y, 0])
-    Om1 = np.array([0.362, 0.264, middle_level]) - np.array([center_x, center_y, 0])
-    Om2 = np.array([0.136, 0.264, middle_level]) - np.array([center_x, center_y, 0])
-    Om3 = np.array([0.136, 0.039, middle_level]) - np.array([center_x, center_y, 0])
-    Om4 = np.array([0.362, 0.039, middle_level]) - np.array([center_x, center_y, 0])
-    Ob1 = np.array([0.362, 0.264, 0.000]) - np.array([center_x, center_y, 0])
-    Ob2 = np.array([0.136, 0.264, 0.000]) - np.array([center_x, center_y, 0])
-    Ob3 = np.array([0.136, 0.039, 0.000]) - np.array([center_x, center_y, 0])
-    Ob4 = np.array([0.362, 0.039, 0.000]) - np.array([center_x, center_y, 0])
+
+if __name__ == "__main__":
+    import scipy.io
 
     x_num = 20
     y_num = 20
@@ -85,39 +216,7 @@ if __name__ == "__main__":
 
                 if x < 0 and -x <= y:
                     if (not check_inside(pos)) and check_collision(pos):
-                        u1 = A1 - pos
-                        u2 = A2 - pos
-
-                        seps, _ = calculate_separation_2(A3, pos, Ot, Om1, Om2, 3)
-                        u31 = seps[-1, :] - pos
-                        seps, _ = calculate_separation_2(A4, pos, Om1, Om2, Ot, 1)
-                        u41 = seps[-1, :] - pos
-
-                        u32 = A3 - pos
-                        seps, _ = calculate_separation_3(A3, pos, Ot, Om2, Ob2, Om3, 4)
-                        u42 = seps[-1, :] - pos
-
-                        u33 = A3 - pos
-                        seps, _ = calculate_separation_2(A3, pos, Ot, Om1, Om2, 3)
-                        u43 = seps[-1, :] - pos
-
-                        seps, _ = calculate_separation_1(A3, pos, Om2, Ob2)
-                        u34 = seps[-1, :] - pos
-                        seps, _ = calculate_separation_2(A4, pos, Om1, Om2, Ot, 1)
-                        u44 = seps[-1, :] - pos
-
-                        J1 = np.vstack((u1, u2, u31, u41))
-                        J2 = np.vstack((u1, u2, u32, u42))
-                        J3 = np.vstack((u1, u2, u33, u43))
-                        J4 = np.vstack((u1, u2, u34, u44))
-
-                        raw1 = calculate_static_raw(J1.T, 0, 50, 1)
-                        raw2 = calculate_static_raw(J2.T, 0, 50, 1)
-                        raw3 = calculate_static_raw(J3.T, 0, 50, 1)
-                        raw4 = calculate_static_raw(J4.T, 0, 50, 1)
-
-                        raw = max([raw1, raw2, raw3, raw4])
-
+                        raw, _ = calculate_wrapped_raw(pos)
                     else:
                         raw = 0
 
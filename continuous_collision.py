@@ -0,0 +1,244 @@
+import numpy as np
+
+from cable_paths import EPS, check_inside_polyhedron, check_segment_penetration, get_obstacle_polyhedron, \
+    get_path_nodes, solve_cable_paths
+from collision_saw import SCENE
+
+TRANSITION_TOLERANCE = 1e-9     # platform travel below which a change of wrapping is checked as one transition
+CONTINUITY_TOLERANCE = 1e-6     # largest gap between the cable paths on either side of a transition
+
+
+def intersect_patch_edges(S0, S1, B0, B1, edges):
+    """
+    :param S0: fixed end of the free cable segment at the first pose, ... x 3
+    :param S1: fixed end of the free cable segment at the second pose, ... x 3
+    :param B0: free end of the cable at the first pose, ... x 3
+    :param B1: free end of the cable at the second pose, ... x 3
+    :param edges: ends of the obstacle edges, e x 2 x 3
+    :return: whether the bilinear patch swept by the segment crosses each edge, ... x e
+
+    The patch is P(t, u) = (1 - u) * ((1 - t) * S0 + t * S1) + u * ((1 - t) * B0 + t * B1), a triangle when
+    S0 = S1. Crossings at u = 0 are ignored, since a wrapped cable rests on the edge there.
+    """
+    a = S0[..., None, :]
+    b = (S1 - S0)[..., None, :]
+    c = (B0 - S0)[..., None, :]
+    d = (B1 - B0 - S1 + S0)[..., None, :]
+    E0 = edges[:, 0]
+    e = edges[:, 1] - edges[:, 0]
+
+    # two directions perpendicular to each edge, the patch meets the edge line where both projections vanish
+    helper = np.eye(3)[np.argmin(np.abs(e), axis=-1)]
+    p = np.cross(e, helper)
+    p /= np.linalg.norm(p, axis=-1, keepdims=True)
+    q = np.cross(e, p)
+    q /= np.linalg.norm(q, axis=-1, keepdims=True)
+
+    def project(direction):
+        return (np.sum((a - E0) * direction, axis=-1), np.sum(b * direction, axis=-1),
+                np.sum(c * direction, axis=-1), np.sum(d * direction, axis=-1))
+
+    alpha1, beta1, gamma1, delta1 = project(p)
+    alpha2, beta2, gamma2, delta2 = project(q)
+
+    # eliminating u gives a quadratic in t
+    A = beta1 * delta2 - beta2 * delta1
+    B = alpha1 * delta2 + beta1 * gamma2 - alpha2 * delta1 - beta2 * gamma1
+    C = alpha1 * gamma2 - alpha2 * gamma1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        root = np.sqrt(np.clip(B ** 2 - 4 * A * C, 0, None))
+        quadratic = np.abs(A) > EPS ** 2
+        t_candidates = np.stack([np.where(quadratic, (-B - root) / (2 * A), -C / B),
+                                 np.where(quadratic, (-B + root) / (2 * A), np.nan)], axis=-1)
+    real = np.stack([np.where(quadratic, B ** 2 - 4 * A * C >= 0, np.abs(B) > EPS ** 2),
+                     quadratic & (B ** 2 - 4 * A * C >= 0)], axis=-1)
+
+    hit = np.zeros(A.shape, dtype=bool)
+    for k in range(2):
+        # roots which do not exist are nan and fail every comparison below
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = t_candidates[..., k]
+            denominator1 = gamma1 + delta1 * t
+            denominator2 = gamma2 + delta2 * t
+            u = np.where(np.abs(denominator1) >= np.abs(denominator2),
+                         -(alpha1 + beta1 * t) / denominator1, -(alpha2 + beta2 * t) / denominator2)
+            point = a + t[..., None] * b + u[..., None] * c + (t * u)[..., None] * d
+            v = np.sum((point - E0) * e, axis=-1) / np.sum(e * e, axis=-1)
+            residual = np.linalg.norm(point - (E0 + v[..., None] * e), axis=-1)
+            hit |= real[..., k] & (t >= -EPS) & (t <= 1 + EPS) & (u > EPS) & (u <= 1 + EPS) & \
+                (v >= -EPS) & (v <= 1 + EPS) & (residual <= 1e3 * EPS)
+
+    return hit
+
+
+def get_wrapping_edges(separations, edges):
+    """
+    :param separations: separation points of a cable, k x 3
+    :param edges: ends of the obstacle edges, e x 2 x 3
+    :return: index of the edge each separation point lies on
+    """
+    E0 = edges[:, 0]
+    e = edges[:, 1] - edges[:, 0]
+    v = np.clip(np.sum((separations[:, None] - E0) * e, axis=-1) / np.sum(e * e, axis=-1), 0, 1)
+    distances = np.linalg.norm(separations[:, None] - (E0 + v[..., None] * e), axis=-1)
+    return tuple(np.argmin(distances, axis=-1))
+
+
+def get_cable_states(poses, anchors, scene):
+    """
+    :param poses: positions of the platform, p x 3
+    :param anchors: fixed ends of the cables, n x 3
+    :param scene: scene built by scene.build_scene
+    :return starts: fixed end of the free cable segment of each cable, p x n x 3
+            wrappings: edges each cable wraps around, p x n x MAX_WRAPS, -1 for padding
+            nodes: anchor, separation points and platform of each cable path, p x n x (MAX_WRAPS + 2) x 3
+    """
+    _, wrappings, points, _ = solve_cable_paths(anchors, poses, scene)
+    wrap_count = np.sum(wrappings >= 0, axis=-1)
+    last_points = np.take_along_axis(points, np.clip(wrap_count - 1, 0, None)[..., None, None], axis=-2)[..., 0, :]
+    starts = np.where((wrap_count > 0)[..., None], last_points, anchors)
+    nodes = get_path_nodes(np.broadcast_to(anchors, starts.shape), np.broadcast_to(poses[:, None, :], starts.shape),
+                           points, wrap_count)
+    return starts, wrappings, nodes
+
+
+def check_node_collision(poses, starts, normals, offsets):
+    """
+    :return: whether the platform or the free segment of any cable is inside the obstacle at each pose
+    """
+    ends = np.broadcast_to(poses[:, None, :], starts.shape)
+    return check_segment_penetration(starts, ends, normals, offsets).any(axis=-1) | \
+        check_inside_polyhedron(poses, normals, offsets)
+
+
+def get_point_distance(points, Q0, Q1):
+    """
+    :return: distance from each point to the segment from Q0 to Q1, ...
+    """
+    e = Q1 - Q0
+    squared = np.sum(e * e, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v = np.where(squared > 0, np.sum((points - Q0) * e, axis=-1) / squared, 0)
+    return np.linalg.norm(points - (Q0 + np.clip(v, 0, 1)[..., None] * e), axis=-1)
+
+
+def get_segment_distance(P0, P1, Q0, Q1):
+    """
+    :return: distance between the segments from P0 to P1 and from Q0 to Q1, ...
+    """
+    u, e, r = P1 - P0, Q1 - Q0, P0 - Q0
+    a, b, c = np.sum(u * u, axis=-1), np.sum(u * e, axis=-1), np.sum(e * e, axis=-1)
+    d, f = np.sum(u * r, axis=-1), np.sum(e * r, axis=-1)
+    denominator = a * c - b * b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = (b * f - c * d) / denominator
+        v = (a * f - b * d) / denominator
+    # the closest points are either inside both segments or at one of the four ends
+    interior = (denominator > EPS ** 2) & (s >= 0) & (s <= 1) & (v >= 0) & (v <= 1)
+    distance = np.where(interior, np.linalg.norm(r + np.nan_to_num(s)[..., None] * u -
+                                                 np.nan_to_num(v)[..., None] * e, axis=-1), np.inf)
+    return np.minimum.reduce([distance, get_point_distance(P0, Q0, Q1), get_point_distance(P1, Q0, Q1),
+                              get_point_distance(Q0, P0, P1), get_point_distance(Q1, P0, P1)])
+
+
+def get_path_distance(nodes1, nodes2):
+    """
+    :param nodes1: nodes of the first cable paths, ... x k x 3
+    :param nodes2: nodes of the second cable paths, ... x k x 3
+    :return: largest distance from a node of either path to the polyline of the other one, ...
+    """
+    def get_node_distance(nodes, polyline):
+        distances = get_point_distance(nodes[..., None, :], polyline[..., None, :-1, :], polyline[..., None, 1:, :])
+        return distances.min(axis=-1).max(axis=-1)
+
+    return np.maximum(get_node_distance(nodes1, nodes2), get_node_distance(nodes2, nodes1))
+
+
+def check_pieces(B0, B1, state0, state1, edges):
+    """
+    :param B0: platform at the start of each piece of a path segment, k x 3
+    :param B1: platform at the end of each piece, k x 3
+    :param state0: cable states at the start of each piece, see get_cable_states
+    :param state1: cable states at the end of each piece
+    :param edges: ends of the obstacle edges, e x 2 x 3
+    :return: whether the free part of any cable passes through the obstacle within each piece, k
+
+    A cable which keeps its wrapping sweeps the patch between its free segments at both ends. A cable which
+    changes its wrapping within the piece must keep its path, a path which jumps to another route around the
+    obstacle has passed through it. The free segment of either side then sweeps the piece on its own, touching
+    the edges the cable wraps onto or leaves. Edges a free segment rests against at either end of the piece are
+    touched rather than crossed, as next to a transition.
+    """
+    (S0, wrappings0, nodes0), (S1, wrappings1, nodes1) = state0, state1
+    ends0 = np.broadcast_to(B0[:, None, :], S0.shape)
+    ends1 = np.broadcast_to(B1[:, None, :], S1.shape)
+    changed = np.any(wrappings0 != wrappings1, axis=-1)
+    touched = (get_segment_distance(S0[..., None, :], ends0[..., None, :], edges[:, 0], edges[:, 1]) <= 1e3 * EPS) | \
+        (get_segment_distance(S1[..., None, :], ends1[..., None, :], edges[:, 0], edges[:, 1]) <= 1e3 * EPS)
+
+    swept = intersect_patch_edges(S0, S1, ends0, ends1, edges) & ~touched
+    edge_index = np.arange(edges.shape[0])
+    moved = np.any(wrappings0[..., None] == edge_index, axis=-2) ^ np.any(wrappings1[..., None] == edge_index, axis=-2)
+    sides = intersect_patch_edges(S0, S0, ends0, ends1, edges) | intersect_patch_edges(S1, S1, ends0, ends1, edges)
+    continuous = get_path_distance(nodes0, nodes1) <= CONTINUITY_TOLERANCE
+    transition = ~continuous | (sides & ~moved & ~touched).any(axis=-1)
+    return np.where(changed, transition, swept.any(axis=-1)).any(axis=-1)
+
+
+def check_path_collision(poses, scene=None):
+    """
+    :param poses: consecutive positions of the platform along a path, (n + 1) x 3
+    :param scene: scene built by scene.build_scene, collision_saw.SCENE if None
+    :return: dictionary with, for each of the n path segments between consecutive poses,
+             'collision': whether the platform or the free part of any cable passes through the obstacle
+                          at any time of the straight-line motion
+             'wrapping_changed': whether a cable wraps, unwraps or moves to another edge between the two poses
+
+    A segment where a cable changes its wrapping is bisected until each piece either has the same wrapping at
+    both ends or is shorter than TRANSITION_TOLERANCE, the latter holding a single transition, see check_pieces.
+    """
+    scene = SCENE if scene is None else scene
+    poses = np.asarray(poses, dtype=float).reshape(-1, 3)
+    edges, normals, offsets = get_obstacle_polyhedron(scene)
+    anchors = np.stack(scene['A_list'])
+
+    states = get_cable_states(poses, anchors, scene)
+    node_collision = check_node_collision(poses, states[0], normals, offsets)
+    platform_collision = check_segment_penetration(poses[:-1], poses[1:], normals, offsets)
+    collision = node_collision[:-1] | node_collision[1:] | platform_collision
+    wrapping_changed = np.any(states[1][:-1] != states[1][1:], axis=(-2, -1))
+
+    # pieces [t0, t1] of the path segments still to be checked, with the cable states at both ends
+    segments = np.arange(poses.shape[0] - 1)
+    t0, t1 = np.zeros(segments.shape), np.ones(segments.shape)
+    state0 = tuple(state[:-1] for state in states)
+    state1 = tuple(state[1:] for state in states)
+    while segments.size:
+        motions = poses[segments + 1] - poses[segments]
+        changed = np.any(state0[1] != state1[1], axis=(-2, -1))
+        split = changed & ((t1 - t0) * np.linalg.norm(motions, axis=-1) > TRANSITION_TOLERANCE) & \
+            ~collision[segments]
+
+        settled = ~split & ~collision[segments]
+        B0 = poses[segments] + t0[:, None] * motions
+        B1 = poses[segments] + t1[:, None] * motions
+        piece_collision = check_pieces(B0[settled], B1[settled], tuple(state[settled] for state in state0),
+                                       tuple(state[settled] for state in state1), edges)
+        np.logical_or.at(collision, segments[settled], piece_collision)
+
+        segments, t0, t1 = segments[split], t0[split], t1[split]
+        if not segments.size:
+            break
+        state0 = tuple(state[split] for state in state0)
+        state1 = tuple(state[split] for state in state1)
+        middle = (t0 + t1) / 2
+        middle_poses = poses[segments] + middle[:, None] * (poses[segments + 1] - poses[segments])
+        middle_state = get_cable_states(middle_poses, anchors, scene)
+        np.logical_or.at(collision, segments, check_node_collision(middle_poses, middle_state[0], normals, offsets))
+
+        segments = np.concatenate((segments, segments))
+        t0, t1 = np.concatenate((t0, middle)), np.concatenate((middle, t1))
+        state0, state1 = (tuple(np.concatenate(pair) for pair in zip(state0, middle_state)),
+                          tuple(np.concatenate(pair) for pair in zip(middle_state, state1)))
+
+    return {'collision': collision, 'wrapping_changed': wrapping_changed}
@@ -18,33 +18,19 @@ z_step_len = (A1(3) - 0.01) / (z_num - 1);
 
 raw_max = max([max(max(max(raw_matrix))), max(max(max(raw_matrix_add)))]);
 
+[X, Y, Z] = ndgrid(A2(1) + 0.01 + (0:(x_num-1)) * x_step_len, ...
+                  A3(2) + 0.01 + (0:(y_num-1)) * y_step_len, ...
+                  0 + (0:(z_num-1)) * z_step_len);
+edgecolor = [0 0.4470 0.7410];
+
 
 figure(1)
 % colormap(slanCM('guppy', 'truncation', [60, 220]))
 colormap(slanCM('parula', 'truncation', [0, round(max(max(max(raw_matrix))) / raw_max * 256)]));
 
-for x_step=0:(x_num-1)
-    for y_step=0:(x_num-1)
-        for z_step=0:(x_num-1)
-
-            x = A2(1) + 0.01 + x_step * x_step_len;
-            y = A3(2) + 0.01 + y_step * y_step_len;
-            z = 0 + z_step * z_step_len;
-
-            raw = raw_matrix(x_step+1, y_step+1, z_step+1);
-            if raw > 0
-                size = raw * 10;
-                color = raw;
-                edgecolor = [0 0.4470 0.7410];
-                
-                scatter3(x, y, z, size, color, 'o', 'filled', MarkerFaceColor='flat', MarkerEdgeColor=edgecolor, MarkerFaceAlpha=.8)
-                hold on
-            end
-            
-
-        end
-    end
-end
+raw = raw_matrix;
+feasible = raw > 0;
+scatter3(X(feasible), Y(feasible), Z(feasible), raw(feasible) * 10, raw(feasible), 'o', 'filled', MarkerFaceColor='flat', MarkerEdgeColor=edgecolor, MarkerFaceAlpha=.8)
 
 set(gcf,'unit','normalized','position', [0, 0, 0.45, 0.5])
 
@@ -70,27 +56,9 @@ view(40, 30)
 figure(2)
 colormap(slanCM('parula', 'truncation', [0, round(max(max(max(raw_matrix_add))) / raw_max * 256)]));
 
-for x_step=0:(x_num-1)
-    for y_step=0:(x_num-1)
-        for z_step=0:(x_num-1)
-
-            x = A2(1) + 0.01 + x_step * x_step_len;
-            y = A3(2) + 0.01 + y_step * y_step_len;
-            z = 0 + z_step * z_step_len;
-
-            raw = raw_matrix_add(x_step+1, y_step+1, z_step+1);
-            if raw > 0
-                size = raw * 10;
-                color = raw;
-                edgecolor = [0 0.4470 0.7410];
-
-                scatter3(x, y, z, size, color, 'o', 'filled', MarkerFaceColor='flat', MarkerEdgeColor=edgecolor, MarkerFaceAlpha=.8)
-                hold on
-            end
-
-        end
-    end
-end
+raw = raw_matrix_add;
+feasible = raw > 0;
+scatter3(X(feasible), Y(feasible), Z(feasible), raw(feasible) * 10, raw(feasible), 'o', 'filled', MarkerFaceColor='flat', MarkerEdgeColor=edgecolor, MarkerFaceAlpha=.8)
 
 set(gcf,'unit','normalized','position', [0, 0, 0.45, 0.5])
 
@@ -115,27 +83,9 @@ view(40, 30)
 figure(3)
 colormap(slanCM('parula', 'truncation', [0, round(max(max(max(raw_matrix))) / raw_max * 256)]));
 
-for x_step=0:(x_num-1)
-    for y_step=0:(x_num-1)
-        for z_step=0:(x_num-1)
-
-            x = A2(1) + 0.01 + x_step * x_step_len;
-            y = A3(2) + 0.01 + y_step * y_step_len;
-            z = 0 + z_step * z_step_len;
-
-            raw = max([raw_matrix(x_step+1, y_step+1, z_step+1), raw_matrix_add(x_step+1, y_step+1, z_step+1)]);
-            if raw > 0
-                size = raw * 10;
-                color = raw;
-                edgecolor = [0 0.4470 0.7410];
-
-                scatter3(x, y, z, size, color, 'o', 'filled', MarkerFaceColor='flat', MarkerEdgeColor=edgecolor, MarkerFaceAlpha=.8)
-                hold on
-            end
-
-        end
-    end
-end
+raw = max(raw_matrix, raw_matrix_add);
+feasible = raw > 0;
+scatter3(X(feasible), Y(feasible), Z(feasible), raw(feasible) * 10, raw(feasible), 'o', 'filled', MarkerFaceColor='flat', MarkerEdgeColor=edgecolor, MarkerFaceAlpha=.8)
 
 set(gcf,'unit','normalized','position', [0, 0, 0.45, 0.5])
 
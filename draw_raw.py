@@ -0,0 +1,190 @@
+import argparse
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from scene import load_config
+from sweep import get_definition, get_positions
+
+SLANCM_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'slanCM_Data.mat')
+EDGE_COLOR = [0, 0.4470, 0.7410]
+
+
+@lru_cache(maxsize=None)
+def load_slan_colormaps(path=SLANCM_DATA):
+    """
+    :param path: slanCM_Data.mat
+    :return names: lower-case names of the colormaps, in the order used by numeric indices of slanCM
+            colors: colors of every colormap, k x 256 x 3
+    """
+    import scipy.io
+
+    data = scipy.io.loadmat(path)
+    colors = np.stack([np.asarray(cmap, dtype=float) for group in data['slandarerCM'].ravel()
+                       for cmap in group['Colors'].ravel()])
+    names = [str(name.ravel()[0]).lower() for name in data['fullNames'].ravel()]
+    colors.setflags(write=False)
+    return names, colors
+
+
+def slan_cm(cmap_type, truncation=(1, 256), num=None):
+    """
+    :param cmap_type: name of the colormap, or its 1-based index as in slanCM.m
+    :param truncation: section of the 256 colors to be used
+    :param num: number of colors sampled uniformly in the section, all colors of the section if None
+    :return: colors, num x 3
+    """
+    names, colors = load_slan_colormaps()
+    if isinstance(cmap_type, str):
+        cmap = colors[names.index(cmap_type.lower())]
+    else:
+        cmap = colors[cmap_type - 1]
+
+    if num is None:
+        num = int(truncation[1] - truncation[0] + 1)
+    indices = np.arange(1, 257)
+    queries = np.linspace(truncation[0], truncation[1], num)
+    return np.stack([np.interp(queries, indices, cmap[:, channel]) for channel in range(3)], axis=-1)
+
+
+def load_raw(path, key=None):
+    """
+    :param path: .mat file of a sweep, .npy file (memory-mapped) or shard directory of sweep_shards
+    :param key: variable of the .mat file, the first raw_matrix* variable if None
+    :return definition: sweep definition, the default scene for .mat and .npy files
+            raw_matrix: raw matrix, x_num x y_num x z_num
+    """
+    if os.path.isdir(path):
+        from sweep_shards import load_merged
+
+        return load_merged(path)
+
+    if path.endswith('.npy'):
+        raw_matrix = np.load(path, mmap_mode='r')
+    else:
+        import scipy.io
+
+        data = scipy.io.loadmat(path)
+        if key is None:
+            key = sorted(name for name in data if name.startswith('raw_matrix'))[0]
+        raw_matrix = data[key]
+
+    config = load_config()
+    config['grid'] = list(raw_matrix.shape)
+    return get_definition(config), raw_matrix
+
+
+def reduce_level_of_detail(positions, raw_matrix, max_points):
+    """
+    :param positions: positions of the cells, x_num x y_num x z_num x 3
+    :param raw_matrix: raw matrix, x_num x y_num x z_num
+    :param max_points: maximum number of cells to keep
+    :return positions: block centers
+            raw_matrix: maximum raw of each block, so that thin feasible regions do not vanish
+            factor: edge length of the blocks in cells
+    """
+    factor = max(int(np.ceil((raw_matrix.size / max_points) ** (1 / 3))), 1)
+    if factor == 1:
+        return positions, np.asarray(raw_matrix), 1
+
+    shape = [-(-n // factor) for n in raw_matrix.shape]
+    pad = [(0, s * factor - n) for s, n in zip(shape, raw_matrix.shape)]
+    raw_blocks = np.pad(np.asarray(raw_matrix, dtype=float), pad, constant_values=-np.inf)
+    raw_blocks = raw_blocks.reshape(shape[0], factor, shape[1], factor, shape[2], factor).max(axis=(1, 3, 5))
+    position_blocks = np.pad(positions, pad + [(0, 0)], constant_values=np.nan)
+    position_blocks = np.nanmean(position_blocks.reshape(shape[0], factor, shape[1], factor, shape[2], factor, 3),
+                                 axis=(1, 3, 5))
+    return position_blocks, raw_blocks, factor
+
+
+def draw_raw(ax, positions, raw_matrix, raw_max, cmap, style='scatter', max_points=20 ** 3):
+    """
+    :param ax: 3d axes
+    :param positions: positions of the cells, x_num x y_num x z_num x 3
+    :param raw_matrix: raw matrix, x_num x y_num x z_num
+    :param raw_max: raw mapped to the top of the colormap, shared by figures to be compared
+    :param cmap: matplotlib colormap
+    :param style: 'scatter' for one marker per feasible cell, 'isosurface' for the boundary of the feasible region
+    :param max_points: maximum number of cells drawn, larger grids are reduced to blocks
+    :return: the mappable for the colorbar
+    """
+    positions, raw_matrix, factor = reduce_level_of_detail(positions, raw_matrix, max_points)
+
+    if style == 'isosurface':
+        from matplotlib import cm
+        from skimage.measure import marching_cubes
+
+        volume = np.where(np.isfinite(raw_matrix), raw_matrix, 0)
+        spacing = tuple(np.nanmean(np.diff(positions, axis=axis)[..., axis]) for axis in range(3))
+        verts, faces, _, _ = marching_cubes(np.pad(volume, 1), level=0, spacing=spacing)
+        verts += positions[0, 0, 0] - np.array(spacing)
+        ax.plot_trisurf(verts[:, 0], verts[:, 1], faces, verts[:, 2], color=EDGE_COLOR, alpha=0.5, linewidth=0)
+        mappable = cm.ScalarMappable(cmap=cmap)
+        mappable.set_clim(0, raw_max)
+        return mappable
+
+    feasible = raw_matrix > 0
+    raw = raw_matrix[feasible]
+    points = positions[feasible]
+    return ax.scatter(points[:, 0], points[:, 1], points[:, 2], s=raw * 10 * factor ** 2, c=raw, cmap=cmap,
+                      vmin=0, vmax=raw_max, marker='o', edgecolors=EDGE_COLOR, alpha=.8, depthshade=False)
+
+
+def decorate(fig, ax, mappable):
+    colorbar = fig.colorbar(mappable, cax=fig.add_axes([0.81, 0.1, 0.025, 0.8]), ticks=[0, 1.5, 3, 4.5, 6, 7.5, 9])
+    colorbar.ax.tick_params(labelsize=20)
+    colorbar.set_label('$r_{AW}$ (N)', fontsize=24)
+
+    ax.set_position([0.1, 0.1, 0.65, 0.9])
+    ax.tick_params(labelsize=20)
+    ax.set_xlabel('x (m)', fontsize=24, labelpad=20)
+    ax.set_ylabel('y (m)', fontsize=24, labelpad=20)
+    ax.set_zlabel('z (m)', fontsize=24, labelpad=20)
+    ax.set_xlim(-0.4, 0.4)
+    ax.set_ylim(-0.4, 0.4)
+    ax.set_zlim(0, 0.8)
+    ax.set_box_aspect((0.8, 0.8, 0.8))
+    ax.view_init(elev=30, azim=40 - 90)     # view(40, 30) in MATLAB
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='draw raw maps, with a combined map when several are given')
+    parser.add_argument('paths', nargs='*', default=['raw.mat', 'raw_add.mat'],
+                        help='.mat files, .npy files or shard directories of the same grid')
+    parser.add_argument('--style', choices=['scatter', 'isosurface'], default='scatter')
+    parser.add_argument('--cmap', default='parula', help='name of a slanCM colormap')
+    parser.add_argument('--max-points', type=int, default=20 ** 3, help='maximum number of cells drawn per figure')
+    parser.add_argument('--save', default=None, help='save the figures as SAVE_<index>.png instead of showing them')
+    args = parser.parse_args()
+
+    import matplotlib
+    if args.save:
+        matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    from matplotlib.colors import ListedColormap
+
+    plt.rcParams['font.family'] = 'serif'
+    plt.rcParams['font.serif'] = ['Times New Roman', 'DejaVu Serif']
+
+    loaded = [load_raw(path) for path in args.paths]
+    definition = loaded[0][0]
+    positions = get_positions(definition)
+    raw_matrices = [raw_matrix for _, raw_matrix in loaded]
+    if len(raw_matrices) > 1:
+        raw_matrices.append(np.maximum.reduce([np.asarray(raw_matrix) for raw_matrix in raw_matrices]))
+
+    raw_max = max(float(np.max(raw_matrix)) for raw_matrix in raw_matrices)
+    cmap = ListedColormap(slan_cm(args.cmap))
+
+    for index, raw_matrix in enumerate(raw_matrices):
+        fig = plt.figure(index + 1, figsize=(8.6, 5.4))
+        ax = fig.add_subplot(projection='3d')
+        mappable = draw_raw(ax, positions, raw_matrix, raw_max, cmap, args.style, args.max_points)
+        decorate(fig, ax, mappable)
+        if args.save:
+            fig.savefig('{}_{}.png'.format(args.save, index + 1))
+
+    if not args.save:
+        plt.show()
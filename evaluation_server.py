@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from collision_saw import evaluate_poses
+
+
+def evaluate_chunks(poses, worker_num):
+    """
+    :param poses: positions of the platform, p x 3
+    :param worker_num: number of chunks to split the batch into
+    :return: list of (start index, chunk) pairs, a single empty chunk for an empty batch
+    """
+    bounds = np.linspace(0, poses.shape[0], max(min(worker_num, poses.shape[0]), 1) + 1).astype(int)
+    return [(start, poses[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def to_nullable(values):
+    """
+    :param values: array of floats
+    :return: nested list of the values, None for non-finite ones which json cannot represent
+    """
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def to_json(result, start, stop):
+    """
+    :param result: output of evaluate_poses for a whole batch
+    :param start: first pose of the request in the batch
+    :param stop: end of the request in the batch
+    :return: json-compatible part of the result belonging to one request
+    """
+    return {
+        'inside': result['inside'][start:stop].tolist(),
+        'collision': result['collision'][start:stop].tolist(),
+        'raw': to_nullable(result['raw'][start:stop]),
+        'path_inside': result['path_inside'][start:stop].tolist(),
+        'path_collision': result['path_collision'][start:stop].tolist(),
+        'lengths': to_nullable(result['lengths'][start:stop]),
+        'separations': [[seps.tolist() for seps in cables] for cables in result['separations'][start:stop]],
+    }
+
+
+class BatchingEvaluator:
+    """
+    Coalesce the poses of concurrent requests into one batch, evaluated by a pool of worker processes.
+
+    A batch is dispatched once it holds max_batch poses or the first request in it has waited
+    latency_budget seconds, whichever comes first.
+    """
+
+    def __init__(self, executor, worker_num, latency_budget=0.005, max_batch=4096):
+        self.executor = executor
+        self.worker_num = worker_num
+        self.latency_budget = latency_budget
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+
+    async def evaluate(self, poses):
+        """
+        :param poses: positions of the platform, p x 3
+        :return: json-compatible evaluation of the poses
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((poses, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self.queue.get()]
+            pose_num = requests[0][0].shape[0]
+            deadline = loop.time() + self.latency_budget
+            while pose_num < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                requests.append(request)
+                pose_num += request[0].shape[0]
+            # evaluate in the background so that the next batch can be collected meanwhile
+            loop.create_task(self.dispatch(requests))
+
+    async def dispatch(self, requests):
+        loop = asyncio.get_running_loop()
+        poses = np.vstack([request[0] for request in requests])
+        try:
+            chunks = evaluate_chunks(poses, self.worker_num)
+            results = await asyncio.gather(*[loop.run_in_executor(self.executor, evaluate_poses, chunk)
+                                             for _, chunk in chunks])
+            result = {key: np.concatenate([r[key] for r in results])
+                      for key in ('inside', 'collision', 'raw', 'path_inside', 'path_collision', 'lengths')}
+            result['separations'] = [cables for r in results for cables in r['separations']]
+        except Exception as error:
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        start = 0
+        for request_poses, future in requests:
+            stop = start + request_poses.shape[0]
+            if not future.done():
+                future.set_result(to_json(result, start, stop))
+            start = stop
+
+
+async def handle_connection(evaluator, reader, writer):
+    """
+    Serve newline-delimited json requests {"id": ..., "poses": [[x, y, z], ...]} on one connection.
+    Requests are answered as soon as they are evaluated, so responses may come back out of order.
+    """
+    lock = asyncio.Lock()
+
+    async def respond(message):
+        response = {'id': message.get('id')}
+        try:
+            poses = np.asarray(message['poses'], dtype=float).reshape(-1, 3)
+            if not np.isfinite(poses).all():
+                raise ValueError('poses must be finite')
+            response.update(await evaluator.evaluate(poses))
+        except Exception as error:
+            response['error'] = '{}: {}'.format(type(error).__name__, error)
+        async with lock:
+            writer.write((json.dumps(response) + '\n').encode())
+            await writer.drain()
+
+    tasks = set()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError as error:
+                async with lock:
+                    writer.write((json.dumps({'id': None, 'error': 'JSONDecodeError: {}'.format(error)}) + '\n').encode())
+                    await writer.drain()
+                continue
+            task = asyncio.create_task(respond(message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        writer.close()
+
+
+async def serve(socket_path=None, port=None, worker_num=None, latency_budget=0.005, max_batch=4096):
+    """
+    :param socket_path: path of the unix socket to listen on
+    :param port: localhost port to listen on instead of a unix socket
+    :param worker_num: number of worker processes, os.cpu_count() if None
+    :param latency_budget: maximum time in seconds a request waits for others to join its batch
+    :param max_batch: number of poses above which a batch is dispatched immediately
+    """
+    worker_num = worker_num or os.cpu_count()
+    with ProcessPoolExecutor(worker_num) as executor:
+        evaluator = BatchingEvaluator(executor, worker_num, latency_budget, max_batch)
+        batching = asyncio.create_task(evaluator.run())
+
+        def callback(reader, writer):
+            return handle_connection(evaluator, reader, writer)
+
+        if port is None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(callback, path=socket_path)
+        else:
+            server = await asyncio.start_server(callback, host='127.0.0.1', port=port)
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batching.cancel()
+
+
+def request_evaluation(poses, socket_path=None, port=None):
+    """
+    :param poses: positions of the platform, p x 3
+    :param socket_path: unix socket of the server
+    :param port: localhost port of the server, used instead of socket_path if given
+    :return: evaluation of the poses, see collision_saw.evaluate_poses
+    """
+    if port is None:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+    else:
+        client = socket.create_connection(('127.0.0.1', port))
+
+    with client, client.makefile('rwb') as stream:
+        message = {'id': 0, 'poses': np.asarray(poses, dtype=float).reshape(-1, 3).tolist()}
+        stream.write((json.dumps(message) + '\n').encode())
+        stream.flush()
+        response = json.loads(stream.readline())
+
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+    return response
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='local batching evaluation server for platform poses')
+    parser.add_argument('--socket', default='/tmp/cdpr_evaluation.sock', help='unix socket to listen on')
+    parser.add_argument('--port', type=int, default=None, help='listen on this localhost port instead of a unix socket')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--latency', type=float, default=5, help='latency budget for coalescing requests (ms)')
+    parser.add_argument('--max-batch', type=int, default=4096, help='number of poses that triggers a batch at once')
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.socket, args.port, args.workers, args.latency / 1000, args.max_batch))
@@ -1,102 +1,141 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import scipy.io
-
-
-def hyperplane_shifting(W, t_min, t_max, m):
-
-    c_list = []
-    d1_list = []
-    d2_list = []
-    for col_index in range(W.shape[1] - 1):
-        for it_index in range(1, W.shape[1] - col_index):
-            c = np.cross(W[:, col_index], W[:, col_index + it_index])
-            c_list.append(c)
-
-    for c_index, c in enumerate(c_list):
-        d1 = m * np.dot(c, np.array([0, 0, -9.8]))
-        d2 = -m * np.dot(c, np.array([0, 0, -9.8]))
-        for col_index in range(W.shape[1]):
-            if np.dot(c, W[:, col_index]) > 0:
-                d1 += t_max * np.dot(c, W[:, col_index])
-                d2 -= t_min * np.dot(c, W[:, col_index])
-            elif np.dot(c, W[:, col_index]) < 0:
-                d1 += t_min * np.dot(c, W[:, col_index])
-                d2 -= t_max * np.dot(c, W[:, col_index])
-            else:
-                pass
-        d1_list.append(d1)
-        d2_list.append(d2)
+from functools import lru_cache
+from itertools import combinations
 
-    return c_list, d1_list, d2_list
+import numpy as np
 
 
-def calculate_static_raw(W, t_min, t_max, m):
-
-    c_list, d1_list, d2_list = hyperplane_shifting(W, t_min, t_max, m)
-
-    r_list = []
-    for index in range(len(d1_list)):
-        c = c_list[index]
-        d1 = d1_list[index]
-        d2 = d2_list[index]
-        if d1 * d2 < 0:
-            r_list.append(-1)
-        else:
-            r_list.append(min([np.abs(d1) / np.linalg.norm(c),
-                               np.abs(d2) / np.linalg.norm(c)]))
-
-    return min(r_list)
-
-
-def check_inside(pos):
-    middle_level = 0.172
-    center_x = 0.249
-    center_y = 0.1515
-    Ot = np.array([center_x, center_y, 0.337]) - np.array([center_x, center_y, 0])
-    Ob1 = np.array([0.362, 0.264, 0.000]) - np.array([center_x, center_y, 0])
-    Ob2 = np.array([0.136, 0.264, 0.000]) - np.array([center_x, center_y, 0])
-    Ob3 = np.array([0.136, 0.039, 0.000]) - np.array([center_x, center_y, 0])
-
-    if ((Ob2[0] < pos[0]) and (pos[0] < Ob1[0]) and (Ob3[1] < pos[1]) and (
-            pos[1] < Ob1[1]) and (0 < pos[2]) and (pos[2] < middle_level)) or (
-            ((middle_level < pos[2]) and (pos[2] < Ot[2])) and (
-            Ob2[0] < pos[0]) and (pos[0] < Ob1[0]) and (
-                    (Ob3[1] / Ob1[0] * abs(pos[0]) < pos[1]) and
-                    (pos[1] < Ob1[1] / Ob1[0] * abs(pos[0])))):
-        is_inside = True
+GRAVITY = np.array([0, 0, -9.8])
+
+
+@lru_cache(maxsize=None)
+def get_subset_tables(cable_num, dof):
+    """
+    :param cable_num: number of cables, namely the column number of W
+    :param dof: degrees of freedom of the wrench space, namely the row number of W (3 or 6)
+    :return subsets: column indices of every (cable_num choose dof - 1) subset, in lexicographic order
+            minor_rows: row indices kept for each cofactor of the generalized cross product
+            signs: cofactor signs (-1)^k of the generalized cross product
+
+    The tables only depend on the cable count and the wrench dimension, so they are built once and
+    shared by every pose.
+    """
+    subsets = np.array(list(combinations(range(cable_num), dof - 1)), dtype=np.intp).reshape(-1, dof - 1)
+    minor_rows = np.array([[row for row in range(dof) if row != k] for k in range(dof)], dtype=np.intp)
+    signs = np.where(np.arange(dof) % 2 == 0, 1.0, -1.0)
+    for table in (subsets, minor_rows, signs):
+        table.setflags(write=False)
+    return subsets, minor_rows, signs
+
+
+def get_gravity_wrench(m, dof=3):
+    """
+    :param m: mass of the platform
+    :param dof: degrees of freedom of the wrench space (3 or 6)
+    :return: gravity wrench of a platform whose centre of mass is at the reference point, [f] or [f; tau]
+    """
+    wrench = np.zeros(dof)
+    wrench[:3] = m * GRAVITY
+    return wrench
+
+
+def get_structure_matrix(Apoints, pos, Bpoints=None, R=None):
+    """
+    :param Apoints: fixed ends of the cables, n x 3
+    :param pos: position of the platform reference point, 3 or ... x 3 for a batch of poses
+    :param Bpoints: attachment points on the platform in the platform frame, n x 3, None for a point mass
+    :param R: rotation matrix of the platform, 3 x 3 or ... x 3 x 3, identity if None
+    :return: structure matrix W, 3 x n for a point mass or 6 x n with rows [u; b x u], batched as ... x dof x n
+    """
+    Apoints = np.asarray(Apoints, dtype=float)
+    pos = np.asarray(pos, dtype=float)
+    if Bpoints is None:
+        vectors = Apoints - pos[..., None, :]
+        return np.swapaxes(vectors / np.linalg.norm(vectors, axis=-1, keepdims=True), -1, -2)
+
+    Bpoints = np.asarray(Bpoints, dtype=float)
+    if R is None:
+        b = np.broadcast_to(Bpoints, pos.shape[:-1] + Bpoints.shape)
     else:
-        is_inside = False
-
-    return is_inside
+        b = np.einsum('...ij,nj->...ni', R, Bpoints)
+    vectors = Apoints - (pos[..., None, :] + b)
+    u = vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.swapaxes(np.concatenate((u, np.cross(b, u)), axis=-1), -1, -2)
+
+
+def hyperplane_shifting(W, t_min, t_max, m, wrenches=None):
+    """
+    :param W: structure matrix, dof x n or ... x dof x n for a batch of poses
+    :param t_min: minimum cable tension
+    :param t_max: maximum cable tension
+    :param m: mass of the platform, only used for the default gravity wrench
+    :param wrenches: task wrench set, dof or k x dof, or ... x k x dof for one set per pose, gravity m * g if None
+    :return c_list: normal vectors of the hyperplanes, ... x s x dof
+            d1_list: signed distances (scaled by |c|) of each task wrench to the upper hyperplanes, ... x s x k
+            d2_list: signed distances (scaled by |c|) of each task wrench to the lower hyperplanes, ... x s x k
+    """
+    W = np.asarray(W, dtype=float)
+    dof, cable_num = W.shape[-2:]
+    if cable_num < dof - 1:
+        raise ValueError("hyperplane shifting needs at least dof - 1 = {} cables, got {}".format(dof - 1, cable_num))
+    subsets, minor_rows, signs = get_subset_tables(cable_num, dof)
+
+    if wrenches is None:
+        wrenches = get_gravity_wrench(m, dof)
+    wrenches = np.asarray(wrenches, dtype=float)
+    if wrenches.ndim == 1:
+        wrenches = wrenches[None, :]
+
+    # generalized cross product of every (dof - 1) column subset, via cofactor expansion
+    columns = np.swapaxes(W[..., subsets], -3, -2)      # ... x s x dof x (dof - 1)
+    c_list = signs * np.linalg.det(columns[..., minor_rows, :])      # ... x s x dof
+
+    projections = c_list @ W        # ... x s x n
+    positive = np.clip(projections, 0, None).sum(axis=-1)
+    negative = np.clip(projections, None, 0).sum(axis=-1)
+    upper = t_max * positive + t_min * negative
+    lower = t_min * positive + t_max * negative
+
+    offsets = c_list @ np.swapaxes(wrenches, -1, -2)       # ... x s x k
+    d1_list = offsets + upper[..., None]
+    d2_list = -offsets - lower[..., None]
 
+    return c_list, d1_list, d2_list
 
-def check_collision(pos):
-    is_coll = False
-
-    A1 = np.array([0.342, 0.342, 0.727])
-    A2 = np.array([-0.342, 0.342, 0.727])
-    A3 = np.array([-0.342, -0.342, 0.727])
-    A4 = np.array([0.342, -0.342, 0.727])
-    A_list = [A1, A2, A3, A4]
-
-    for cable_index in range(4):
-        if not is_coll:
-            for i in range(100):
-                check_point = pos + (A_list[cable_index] - pos) / 100 * i
-                if check_inside(check_point):
-                    is_coll = True
-                    break
 
-    return is_coll
+def calculate_static_raw(W, t_min, t_max, m, wrenches=None):
+    """
+    :param W: structure matrix, dof x n or ... x dof x n for a batch of poses
+    :param t_min: minimum cable tension
+    :param t_max: maximum cable tension
+    :param m: mass of the platform, only used for the default gravity wrench
+    :param wrenches: task wrench set, dof or k x dof, or ... x k x dof for one set per pose, gravity m * g if None
+    :return: radius of the available wrench (-1 if any task wrench is infeasible or W does not span the wrench
+             space), NaN where W or the task wrenches contain NaN, scalar or one per pose
+    """
+    W = np.asarray(W, dtype=float)
+    c_list, d1_list, d2_list = hyperplane_shifting(W, t_min, t_max, m, wrenches)
+
+    c_norm = np.linalg.norm(c_list, axis=-1)[..., None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_list = np.minimum(np.abs(d1_list), np.abs(d2_list)) / c_norm
+    # degenerate subsets (linearly dependent columns) do not define a hyperplane
+    r_list = np.where(c_norm > 0, r_list, np.inf)
+    r_list = np.where(d1_list * d2_list < 0, -1, r_list)
+    raw = r_list.min(axis=(-2, -1))
+
+    # the cables cannot balance wrenches outside the span of W, so no wrench set around the task is available
+    rank = np.linalg.matrix_rank(np.nan_to_num(W))
+    raw = np.where(rank < W.shape[-2], -1, raw)
+    # the hyperplanes of undefined poses or task wrenches are undefined, the degenerate-subset mask drops their NaN
+    undefined = np.isnan(d1_list).any(axis=(-2, -1)) | np.isnan(W).any(axis=(-2, -1))
+    raw = np.where(undefined, np.nan, raw)
+    return raw if raw.ndim else float(raw)
 
 
 if __name__ == "__main__":
-
-    A1 = np.array([0.342, 0.342, 0.727])
-    A2 = np.array([-0.342, 0.342, 0.727])
-    A3 = np.array([-0.342, -0.342, 0.727])
-    A4 = np.array([0.342, -0.342, 0.727])
+    import matplotlib.pyplot as plt
+    import scipy.io
+    from collision_saw import A1, A2, A3, A4, check_collision
 
     x_num = 20
     y_num = 20
@@ -0,0 +1,84 @@
+import copy
+import json
+
+import numpy as np
+
+DEFAULT_SCENE = {
+    # fixed ends of the cables, counterclockwise from the (+x, +y) corner of the frame
+    'anchors': [[0.342, 0.342, 0.727], [-0.342, 0.342, 0.727], [-0.342, -0.342, 0.727], [0.342, -0.342, 0.727]],
+    'obstacle': {
+        # x-y corners of the obstacle in the measurement frame, in the same order as the anchors
+        'corners': [[0.362, 0.264], [0.136, 0.264], [0.136, 0.039], [0.362, 0.039]],
+        # the obstacle is moved so that this point lies on the z axis
+        'center': [0.249, 0.1515],
+        'middle_level': 0.172,
+        'top': 0.337,
+    },
+}
+
+DEFAULT_CONFIG = {
+    'mode': 'wrapped',
+    'grid': [20, 20, 20],
+    'limits': {'t_min': 0, 't_max': 50, 'm': 1},
+    'scene': DEFAULT_SCENE,
+    'workers': None,
+    'output': None,
+}
+
+
+def build_scene(scene=None):
+    """
+    :param scene: scene parameters as in DEFAULT_SCENE, DEFAULT_SCENE if None
+    :return: dictionary of the anchors 'A_list' and the obstacle vertices 'Ot', 'Om1' - 'Om4', 'Ob1' - 'Ob4'
+    """
+    scene = DEFAULT_SCENE if scene is None else scene
+    obstacle = scene['obstacle']
+    center = np.array([obstacle['center'][0], obstacle['center'][1], 0])
+    middle_level = obstacle['middle_level']
+
+    vertices = {'A_list': [np.array(A, dtype=float) for A in scene['anchors']],
+                'Ot': np.array([center[0], center[1], obstacle['top']]) - center}
+    for index, (x, y) in enumerate(obstacle['corners']):
+        vertices['Om{}'.format(index + 1)] = np.array([x, y, middle_level]) - center
+        vertices['Ob{}'.format(index + 1)] = np.array([x, y, 0.000]) - center
+    return vertices
+
+
+def check_default_scene(scene):
+    """
+    The wrapped raw is only solved in the region x < 0 and -x <= y and mirrored by the frame symmetries, with the
+    wrapping configurations of collision_saw.calculate_wrapped_raw, all of which are written for DEFAULT_SCENE.
+    Refuse any other scene rather than silently returning a wrong map.
+    """
+    obstacle, expected = scene['obstacle'], DEFAULT_SCENE['obstacle']
+    if not (np.shape(scene['anchors']) == np.shape(DEFAULT_SCENE['anchors']) and
+            np.allclose(scene['anchors'], DEFAULT_SCENE['anchors']) and
+            all(np.shape(obstacle[name]) == np.shape(value) and np.allclose(obstacle[name], value)
+                for name, value in expected.items())):
+        raise ValueError("the wrapped raw is only available for the default scene, use the plain mode instead")
+
+
+def merge_config(base, override):
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_config(path=None):
+    """
+    :param path: json file overriding any part of DEFAULT_CONFIG, DEFAULT_CONFIG if None
+    :return: sweep configuration
+    """
+    if path is None:
+        return copy.deepcopy(DEFAULT_CONFIG)
+    with open(path) as file:
+        config = merge_config(DEFAULT_CONFIG, json.load(file))
+    if config['mode'] not in ('plain', 'wrapped'):
+        raise ValueError("mode should be 'plain' or 'wrapped', got {!r}".format(config['mode']))
+    if len(config['scene']['anchors']) != 4 or len(config['scene']['obstacle']['corners']) != 4:
+        raise ValueError("the scene should have 4 anchors and 4 obstacle corners")
+    return config
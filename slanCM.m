@@ -20,8 +20,11 @@ else
     num = p.Results.num;
 end
 
-slanCM_Data = load('slanCM_Data.mat');
-CList_Data = [slanCM_Data.slandarerCM(:).Colors];
+persistent slanCM_Data CList_Data   % 只在第一次调用时读取色带数据
+if isempty(slanCM_Data)
+    slanCM_Data = load('slanCM_Data.mat');
+    CList_Data = [slanCM_Data.slandarerCM(:).Colors];
+end
 % disp(slanCM_Data.author);
 
 if isnumeric(type)
@@ -0,0 +1,178 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from collision_saw import check_collision_batch, check_inside_batch, calculate_wrapped_raw
+from hyperplane_shifting import calculate_static_raw, get_structure_matrix
+from scene import build_scene, check_default_scene, load_config
+
+BLOCK_SIZE = 2048       # poses evaluated together, bounds the memory of the batched collision check
+
+
+def get_definition(config):
+    """
+    :param config: sweep configuration, see scene.load_config
+    :return: the part of the configuration which determines the result of the sweep
+    """
+    return {key: config[key] for key in ('mode', 'grid', 'limits', 'scene')}
+
+
+def check_definition(definition):
+    """
+    The plain sweep evaluates every cell and works for any scene, the wrapped one mirrors the cells of one
+    eighth of the frame, which needs the default scene and as many cells along x as along y.
+    """
+    if definition['mode'] not in ('plain', 'wrapped'):
+        raise ValueError("mode should be 'plain' or 'wrapped', got {!r}".format(definition['mode']))
+    if definition['mode'] == 'wrapped':
+        check_default_scene(definition['scene'])
+        if definition['grid'][0] != definition['grid'][1]:
+            raise ValueError("the wrapped sweep needs x_num == y_num, got {}".format(definition['grid']))
+
+
+def get_positions(definition):
+    """
+    :return: positions of all cells of the grid, x_num x y_num x z_num x 3, same spacing as the sweep scripts
+    """
+    A1, A2, A3, _ = build_scene(definition['scene'])['A_list']
+    x_num, y_num, z_num = definition['grid']
+
+    x_step_len = (A1[0] - A2[0] - 0.02) / (x_num - 1)
+    y_step_len = (A1[1] - A3[1] - 0.02) / (y_num - 1)
+    z_step_len = (A1[2] - 0.01) / (z_num - 1)
+
+    x = A2[0] + 0.01 + np.arange(x_num) * x_step_len
+    y = A3[1] + 0.01 + np.arange(y_num) * y_step_len
+    z = 0 + np.arange(z_num) * z_step_len
+    return np.stack(np.meshgrid(x, y, z, indexing='ij'), axis=-1)
+
+
+def get_cells(definition):
+    """
+    :return: flat indices of the cells to be evaluated, the region x < 0 and -x <= y in wrapped mode
+    """
+    positions = get_positions(definition).reshape(-1, 3)
+    if definition['mode'] == 'plain':
+        return np.arange(positions.shape[0])
+    x, y = positions[:, 0], positions[:, 1]
+    return np.flatnonzero((x < 0) & (-x <= y))
+
+
+def evaluate_cells(definition, positions):
+    """
+    :param positions: positions of the cells, p x 3
+    :return: raw of each cell, as computed by the plain or wrapped sweep
+    """
+    scene = build_scene(definition['scene'])
+    limits = definition['limits']
+    t_min, t_max, m = limits['t_min'], limits['t_max'], limits['m']
+    raw = np.zeros(positions.shape[0])
+    collision = check_collision_batch(positions, scene=scene)
+
+    if definition['mode'] == 'plain':
+        free = ~collision
+        if free.any():
+            W = get_structure_matrix(np.stack(scene['A_list']), positions[free])
+            raw[free] = calculate_static_raw(W, t_min, t_max, m)
+    else:
+        for index in np.flatnonzero(collision & ~check_inside_batch(positions, scene)):
+            raw[index], _ = calculate_wrapped_raw(positions[index], t_min, t_max, m, scene)
+
+    return raw
+
+
+def fill_symmetric(raw_matrix, x_step, y_step, z_step, raw):
+    """
+    Copy the raw of cells in the region x < 0 and -x <= y onto their images under the frame symmetries,
+    the same way as the wrapped sweep in collision_saw.
+    """
+    x_num, y_num = raw_matrix.shape[:2]
+    raw_matrix[x_step, y_step, z_step] = raw
+    raw_matrix[x_num - x_step - 1, y_step, z_step] = raw
+    raw_matrix[x_step, y_num - y_step - 1, z_step] = raw
+    raw_matrix[x_num - x_step - 1, y_num - y_step - 1, z_step] = raw
+
+    raw_matrix[y_num - y_step - 1, x_num - x_step - 1, z_step] = raw
+    raw_matrix[x_num - (y_num - y_step), x_num - x_step - 1, z_step] = raw
+    raw_matrix[y_num - y_step - 1, y_num - (x_num - x_step), z_step] = raw
+    raw_matrix[x_num - (y_num - y_step), y_num - (x_num - x_step), z_step] = raw
+
+
+def assemble_raw_matrix(definition, cells, raw):
+    """
+    :param cells: flat indices of the evaluated cells, as given by get_cells
+    :param raw: raw of the evaluated cells
+    :return: raw matrix, x_num x y_num x z_num
+    """
+    grid = definition['grid']
+    if definition['mode'] == 'plain':
+        raw_matrix = np.zeros(int(np.prod(grid)))
+        raw_matrix[cells] = raw
+        return raw_matrix.reshape(grid)
+
+    raw_matrix = np.zeros(grid)
+    for cell, value in zip(cells, raw):
+        fill_symmetric(raw_matrix, *np.unravel_index(cell, grid), value)
+    return raw_matrix
+
+
+def save_raw_matrix(definition, raw_matrix, output=None):
+    """
+    :param output: path of the .mat file, raw.mat for plain and raw_add.mat for wrapped sweeps if None
+    """
+    import scipy.io
+
+    if definition['mode'] == 'plain':
+        output, key = output or 'raw.mat', 'raw_matrix'
+    else:
+        output, key = output or 'raw_add.mat', 'raw_matrix_add'
+    scipy.io.savemat(output, {key: raw_matrix})
+    return output
+
+
+def run_sweep(config):
+    """
+    :param config: sweep configuration, see scene.load_config
+    :return: raw matrix, x_num x y_num x z_num
+    """
+    definition = get_definition(config)
+    check_definition(definition)
+    cells = get_cells(definition)
+    positions = get_positions(definition).reshape(-1, 3)[cells]
+    worker_num = config['workers'] or os.cpu_count()
+
+    block_num = -(-positions.shape[0] // BLOCK_SIZE)
+    if definition['mode'] == 'wrapped':
+        # wrapped cells are expensive and clustered, smaller blocks spread them over the workers
+        block_num = max(block_num, 4 * worker_num)
+    blocks = np.array_split(positions, max(min(block_num, positions.shape[0]), 1))
+
+    if worker_num == 1 or len(blocks) == 1:
+        results = [evaluate_cells(definition, block) for block in blocks]
+    else:
+        with ProcessPoolExecutor(worker_num) as executor:
+            results = list(executor.map(partial(evaluate_cells, definition), blocks))
+
+    return assemble_raw_matrix(definition, cells, np.concatenate(results + [np.zeros(0)]))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='sweep the radius of the available wrench over the workspace grid')
+    parser.add_argument('config', nargs='?', default=None, help='json file overriding the default configuration')
+    parser.add_argument('--mode', choices=['plain', 'wrapped'], default=None)
+    parser.add_argument('--grid', type=int, nargs=3, default=None, metavar=('X_NUM', 'Y_NUM', 'Z_NUM'))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    for key in ('mode', 'grid', 'workers', 'output'):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    raw_matrix = run_sweep(config)
+    print(save_raw_matrix(get_definition(config), raw_matrix, config['output']))
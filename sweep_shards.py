@@ -0,0 +1,188 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from scene import load_config
+from sweep import BLOCK_SIZE, check_definition, get_definition, get_positions, get_cells, evaluate_cells, \
+    assemble_raw_matrix, save_raw_matrix
+
+DEFINITION_FILE = 'sweep.json'
+
+
+def get_shard_definition(config, shard_num):
+    """
+    :param config: sweep configuration, see scene.load_config
+    :param shard_num: number of independent shard jobs
+    :return: sweep definition shared by all shard jobs
+    """
+    definition = get_definition(config)
+    definition['shard_num'] = int(shard_num)
+    return definition
+
+
+def get_definition_hash(definition):
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+
+
+def get_shard_cells(definition, shard_index):
+    # strided rather than contiguous, so that expensive regions are spread over all shards
+    return get_cells(definition)[shard_index::definition['shard_num']]
+
+
+def get_shard_path(directory, shard_index, shard_num):
+    return os.path.join(directory, 'shard_{:05d}_of_{:05d}.npz'.format(shard_index, shard_num))
+
+
+def plan(directory, definition):
+    """
+    Write the sweep definition into the shared directory. Planning again with the same definition is a no-op.
+    """
+    check_definition(definition)
+    if definition['shard_num'] < 1:
+        raise ValueError("a sweep needs at least one shard, got {}".format(definition['shard_num']))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, DEFINITION_FILE)
+    if os.path.exists(path):
+        with open(path) as file:
+            if get_definition_hash(json.load(file)) != get_definition_hash(definition):
+                raise ValueError("{} already holds a different sweep".format(directory))
+        return
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'w') as file:
+        json.dump(definition, file, indent=2)
+    os.replace(temp_path, path)
+
+
+def load_definition(directory):
+    with open(os.path.join(directory, DEFINITION_FILE)) as file:
+        return json.load(file)
+
+
+def load_shard(path, definition_hash, cells):
+    """
+    :return: raw values stored in the shard file, or None if it is missing or not a complete result of this sweep
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as shard:
+            if str(shard['definition_hash']) != definition_hash or not np.array_equal(shard['cells'], cells):
+                return None
+            raw = shard['raw']
+    except (OSError, ValueError, KeyError):
+        return None
+    if raw.shape != cells.shape or np.isnan(raw).any():
+        return None
+    return raw
+
+
+def run_shard(directory, shard_index):
+    """
+    Evaluate one shard and write its chunk file. A shard which is already complete is not evaluated again,
+    and the file only appears once fully written, so the job can be rerun or run twice at the same time.
+    """
+    definition = load_definition(directory)
+    check_definition(definition)
+    shard_num = definition['shard_num']
+    if not 0 <= shard_index < shard_num:
+        raise ValueError("shard index should be in [0, {}), got {}".format(shard_num, shard_index))
+
+    definition_hash = get_definition_hash(definition)
+    cells = get_shard_cells(definition, shard_index)
+    path = get_shard_path(directory, shard_index, shard_num)
+    if load_shard(path, definition_hash, cells) is not None:
+        return path
+
+    positions = get_positions(definition).reshape(-1, 3)[cells]
+    raw = np.concatenate([evaluate_cells(definition, positions[start:start + BLOCK_SIZE])
+                          for start in range(0, positions.shape[0], BLOCK_SIZE)] + [np.zeros(0)])
+
+    temp_path = '{}.{}.tmp.npz'.format(path[:-len('.npz')], os.getpid())
+    np.savez(temp_path, definition_hash=definition_hash, cells=cells, raw=raw)
+    os.replace(temp_path, path)
+    return path
+
+
+def load_merged(directory):
+    """
+    Check that every shard is present and belongs to the planned sweep, then assemble the raw matrix.
+
+    :return: sweep definition and raw matrix, x_num x y_num x z_num
+    """
+    definition = load_definition(directory)
+    definition_hash = get_definition_hash(definition)
+    shard_num = definition['shard_num']
+    grid = definition['grid']
+
+    expected = {get_shard_path(directory, index, shard_num) for index in range(shard_num)}
+    stray = set(glob.glob(os.path.join(directory, 'shard_*.npz'))) - expected
+    if stray:
+        raise ValueError("shard files of another plan in {}: {}".format(directory, sorted(stray)))
+
+    values = np.full(int(np.prod(grid)), np.nan)
+    missing = []
+    for shard_index in range(shard_num):
+        cells = get_shard_cells(definition, shard_index)
+        raw = load_shard(get_shard_path(directory, shard_index, shard_num), definition_hash, cells)
+        if raw is None:
+            missing.append(shard_index)
+        else:
+            values[cells] = raw
+    if missing:
+        raise ValueError("missing or incomplete shards: {}".format(missing))
+
+    cells = get_cells(definition)
+    if np.isnan(values[cells]).any():
+        raise ValueError("the shards do not cover the whole sweep")
+
+    return definition, assemble_raw_matrix(definition, cells, values[cells])
+
+
+def merge(directory, output=None):
+    """
+    :param output: path of the .mat file, raw.mat for plain and raw_add.mat for wrapped sweeps if None
+    :return: raw matrix, x_num x y_num x z_num
+    """
+    definition, raw_matrix = load_merged(directory)
+    save_raw_matrix(definition, raw_matrix, output)
+    return raw_matrix
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='split a raw sweep into shard jobs on a shared directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = subparsers.add_parser('plan', help='write the sweep definition')
+    plan_parser.add_argument('directory')
+    plan_parser.add_argument('--config', default=None, help='json file overriding the default configuration')
+    plan_parser.add_argument('--mode', choices=['plain', 'wrapped'], default=None)
+    plan_parser.add_argument('--shards', type=int, required=True)
+    plan_parser.add_argument('--grid', type=int, nargs=3, default=None, metavar=('X_NUM', 'Y_NUM', 'Z_NUM'))
+
+    run_parser = subparsers.add_parser('run', help='evaluate shards, skipping the complete ones')
+    run_parser.add_argument('directory')
+    run_parser.add_argument('shards', type=int, nargs='*', help='shard indices, all shards if omitted')
+
+    merge_parser = subparsers.add_parser('merge', help='check the shards and write the .mat file')
+    merge_parser.add_argument('directory')
+    merge_parser.add_argument('--output', default=None)
+
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        config = load_config(args.config)
+        for key in ('mode', 'grid'):
+            if getattr(args, key) is not None:
+                config[key] = getattr(args, key)
+        plan(args.directory, get_shard_definition(config, args.shards))
+    elif args.command == 'run':
+        shard_num = load_definition(args.directory)['shard_num']
+        for shard_index in args.shards or range(shard_num):
+            print(run_shard(args.directory, shard_index))
+    else:
+        merge(args.directory, args.output)
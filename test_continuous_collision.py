@@ -0,0 +1,70 @@
+import numpy as np
+
+from cable_paths import check_inside_polyhedron, check_segment_penetration, get_obstacle_polyhedron
+from collision_saw import SCENE, evaluate_poses
+from continuous_collision import check_path_collision
+
+ANCHORS = np.stack(SCENE['A_list'])
+EDGES, NORMALS, OFFSETS = get_obstacle_polyhedron(SCENE)
+
+
+def check_straight_collision(poses):
+    """
+    :return: whether the platform or any straight cable passes through the obstacle at each pose
+    """
+    ends = np.broadcast_to(poses[:, None, :], poses.shape[:1] + ANCHORS.shape)
+    return check_inside_polyhedron(poses, NORMALS, OFFSETS) | \
+        check_segment_penetration(np.broadcast_to(ANCHORS, ends.shape), ends, NORMALS, OFFSETS).any(axis=-1)
+
+
+def sample_straight_segments(segment_num, max_length, seed):
+    rng = np.random.default_rng(seed)
+    # around the obstacle, where the cables collide
+    starts = rng.uniform([-0.25, -0.25, 0], [0.25, 0.25, 0.4], (20 * segment_num, 3))
+    ends = np.clip(starts + rng.uniform(-max_length, max_length, starts.shape), [-0.25, -0.25, 0], 0.4)
+    straight = ~check_straight_collision(starts) & ~check_straight_collision(ends)
+    return starts[straight][:segment_num], ends[straight][:segment_num]
+
+
+def test_straight_segments_match_dense_sampling():
+    starts, ends = sample_straight_segments(1000, 0.3, seed=0)
+    ratios = np.linspace(0, 1, 4001)[:, None]
+
+    # one path through all segments, the even path segments are the sampled ones
+    result = check_path_collision(np.stack([starts, ends], axis=1).reshape(-1, 3))
+    collision, wrapping_changed = result['collision'][::2], result['wrapping_changed'][::2]
+    dense = np.array([check_straight_collision(start + ratios * (end - start)).any()
+                      for start, end in zip(starts, ends)])
+    assert dense.any() and not dense.all()
+    assert not wrapping_changed.any()
+    np.testing.assert_array_equal(collision, dense)
+
+
+def test_stationary_wrapped_poses_are_free():
+    rng = np.random.default_rng(1)
+    poses = rng.uniform([-0.33, -0.33, 0], [0.33, 0.33, 0.72], (2000, 3))
+    lengths = evaluate_poses(poses)['lengths']
+    wrapped = check_straight_collision(poses) & ~np.isnan(lengths).any(axis=-1)
+
+    # every wrapped pose twice, separated by a pose inside the obstacle so that the moves in between collide at
+    # once instead of being bisected
+    inner = np.broadcast_to([0, 0, 0.1], (wrapped.sum(), 1, 3))
+    path = np.concatenate((np.repeat(poses[wrapped][:, None], 2, axis=1), inner), axis=1).reshape(-1, 3)
+    result = check_path_collision(path)
+    assert wrapped.sum() > 100
+    assert not result['collision'][::3].any() and not result['wrapping_changed'][::3].any()
+    assert result['collision'][1::3].all()
+
+
+def test_cable_wrapping_onto_an_edge_is_free():
+    # cables 1 and 4 are straight at the first pose and wrap around the obstacle at the last one
+    result = check_path_collision(np.array([[-0.33, 0, 0.15], [-0.13, 0, 0.15]]))
+    assert result['wrapping_changed'][0]
+    assert not result['collision'][0]
+
+
+def test_cable_jumping_to_another_route_collides():
+    # cable 1 leaves the pair of edges it wraps around for an edge on the other side of the obstacle
+    result = check_path_collision(np.array([[-0.2, -0.05, 0.02], [-0.2, 0.05, 0.02]]))
+    assert result['wrapping_changed'][0]
+    assert result['collision'][0]
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from hyperplane_shifting import calculate_static_raw, get_structure_matrix
+from scene import build_scene
+
+ANCHORS = np.stack(build_scene()['A_list'])
+
+
+def test_rank_deficient_structure_matrix_is_infeasible():
+    # with every cable attached at the reference point the platform cannot resist any torque
+    pos = np.array([0.05, -0.02, 0.3])
+    anchors = np.concatenate([ANCHORS, ANCHORS * [0.5, 0.5, 0.2]])
+    W = get_structure_matrix(anchors, pos, Bpoints=np.zeros((8, 3)))
+    assert np.linalg.matrix_rank(W) == 3
+    assert calculate_static_raw(W, 0, 50, 1) == -1
+
+
+def test_parallel_columns_are_infeasible():
+    W = np.array([[0, 0, 1, -1], [0, 0, 0, 0], [1, -1, 1, -1]], dtype=float)
+    assert calculate_static_raw(W, 0, 50, 1) == -1
+
+
+def test_undefined_pose_propagates_nan():
+    poses = np.array([[0, 0, 0.3], [np.nan, 0, 0.3]])
+    raw = calculate_static_raw(get_structure_matrix(ANCHORS, poses), 0, 50, 1)
+    assert raw[0] > 0
+    assert np.isnan(raw[1])
+
+
+def test_too_few_cables_are_rejected():
+    with pytest.raises(ValueError):
+        calculate_static_raw(np.eye(3)[:, :1], 0, 50, 1)
@@ -0,0 +1,64 @@
+import numpy as np
+
+from collision_saw import SCENE, check_collision_batch, evaluate_poses
+from scene import load_config
+from sweep import get_definition, get_positions
+from uncertainty import propagate_raw_uncertainty, run_uncertainty_sweep, sample_perturbations
+
+
+def test_zero_perturbation_reproduces_nominal_raw():
+    config = load_config()
+    config['grid'] = [12, 12, 12]
+    config['workers'] = 1
+    perturbations = sample_perturbations(4, 0, 0, (1, 1))
+    result = run_uncertainty_sweep(config, perturbations)
+
+    raw_matrix = evaluate_poses(get_positions(get_definition(config)).reshape(-1, 3))['raw'].reshape(12, 12, 12)
+    np.testing.assert_allclose(result['raw_matrix'], raw_matrix)
+    for index in range(result['raw_quantiles'].shape[-1]):
+        np.testing.assert_allclose(result['raw_quantiles'][..., index], raw_matrix, atol=1e-12)
+    np.testing.assert_array_equal(result['p_infeasible'], raw_matrix <= 0)
+
+
+def test_pyramid_apex_stays_feasible():
+    # free of the check_inside region although inside the pyramid roof of the obstacle polyhedron
+    pose = np.array([[0, 0, 0.2625]])
+    result = propagate_raw_uncertainty(pose, sample_perturbations(4, 0, 0, (1, 1)))
+    assert result['raw'][0] > 0
+    assert result['p_infeasible'][0] == 0
+    np.testing.assert_allclose(result['quantiles'][0], result['raw'][0], atol=1e-12)
+
+
+def evaluate_perturbed_scenes(pose, perturbations):
+    """
+    :return: collision and raw of evaluate_poses in each perturbed scene, moved so that the obstacle is nominal
+    """
+    collision, raw = [], []
+    for anchors, offset, m in zip(perturbations['anchors'], perturbations['obstacle'], perturbations['m']):
+        scene = dict(SCENE, A_list=list(np.stack(SCENE['A_list']) + anchors - offset))
+        result = evaluate_poses(pose - offset, m=m, scene=scene)
+        collision.append(result['collision'][0])
+        raw.append(result['raw'][0])
+    return np.array(collision), np.array(raw)
+
+
+def check_perturbed_scenes(pose, perturbations):
+    collision, raw = evaluate_perturbed_scenes(pose, perturbations)
+    result = propagate_raw_uncertainty(pose, perturbations, quantiles=np.linspace(0, 1, raw.shape[0]))
+    np.testing.assert_allclose(result['quantiles'][0], np.sort(raw), atol=1e-12)
+    assert result['p_infeasible'][0] == np.mean(raw <= 0)
+    return collision
+
+
+def test_newly_colliding_samples_are_wrapped():
+    # the nominal cables are straight, moving the obstacle makes some of them collide
+    pose = np.array([[-0.332, -0.332, 0]])
+    collision = check_perturbed_scenes(pose, sample_perturbations(32, 0, 0.001, (1, 1), seed=0))
+    assert not check_collision_batch(pose)[0]
+    assert collision.any() and not collision.all()
+
+
+def test_wrapped_samples_match_evaluate_poses():
+    pose = np.array([[-0.103, 0.128, 0.054]])
+    collision = check_perturbed_scenes(pose, sample_perturbations(32, 0.001, 0.001, (0.5, 1.5), seed=1))
+    assert collision.all()
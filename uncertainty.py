@@ -0,0 +1,253 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from collision_saw import calculate_wrapped_raw, check_inside_batch, evaluate_poses, get_symmetry
+from cable_paths import get_obstacle_polyhedron, minimize_on_edge
+from continuous_collision import get_wrapping_edges
+from hyperplane_shifting import GRAVITY, calculate_static_raw
+from scene import build_scene, check_default_scene, load_config
+from sweep import get_definition, get_positions
+
+WRAP_ITERATIONS = 20        # coordinate descent sweeps when re-solving the separation points
+SAMPLE_BUDGET = 2 ** 18     # poses x samples evaluated together, bounds the memory of a block
+EDGE_TOLERANCE = 1e-3       # the obstacle of the default scene is not quite square, so the separation points
+                            # mirrored by collision_saw.SYMMETRIES lie up to 0.71 mm off the obstacle edges
+
+
+def sample_perturbations(sample_num, anchor_std=0.001, obstacle_std=0.001, m_range=(1, 1), cable_num=4, seed=None):
+    """
+    :param sample_num: number of perturbed scenes
+    :param anchor_std: standard deviation of the anchor placement error along each axis
+    :param obstacle_std: standard deviation of the obstacle placement error along each axis
+    :param m_range: payload masses are drawn uniformly from this range
+    :return: dictionary with the anchor offsets 'anchors' (k x n x 3), obstacle offsets 'obstacle' (k x 3)
+             and payload masses 'm' (k)
+    """
+    rng = np.random.default_rng(seed)
+    return {'anchors': rng.normal(0, anchor_std, (sample_num, cable_num, 3)),
+            'obstacle': rng.normal(0, obstacle_std, (sample_num, 3)),
+            'm': rng.uniform(m_range[0], m_range[1], sample_num)}
+
+
+def get_wrap_chains(separations, edges):
+    """
+    :param separations: separation points of every cable at every pose, as 'raw_separations' of evaluate_poses
+    :param edges: ends of the obstacle edges, e x 2 x 3
+    :return chain_edges: edge of each separation point, -1 for padding and -2 for points not on an edge, p x n x w
+            chain_points: separation points, p x n x w x 3
+    """
+    pose_num, cable_num = len(separations), len(separations[0])
+    wrap_num = max([1] + [cable.shape[0] for cables in separations for cable in cables])
+    chain_edges = np.full((pose_num, cable_num, wrap_num), -1)
+    chain_points = np.zeros((pose_num, cable_num, wrap_num, 3))
+
+    for index, cables in enumerate(separations):
+        for cable_index, points in enumerate(cables):
+            if not points.shape[0]:
+                continue
+            on_edges = np.array(get_wrapping_edges(points, edges))
+            E0, E1 = edges[on_edges, 0], edges[on_edges, 1]
+            v = np.clip(np.sum((points - E0) * (E1 - E0), axis=-1) / np.sum((E1 - E0) ** 2, axis=-1), 0, 1)
+            distances = np.linalg.norm(points - (E0 + v[:, None] * (E1 - E0)), axis=-1)
+            chain_edges[index, cable_index, :points.shape[0]] = np.where(distances < EDGE_TOLERANCE, on_edges, -2)
+            chain_points[index, cable_index, :points.shape[0]] = points
+
+    return chain_edges, chain_points
+
+
+def solve_wraps(anchors, poses, edges, chain_edges, chain_points):
+    """
+    :param anchors: fixed ends of the cables, ... x n x 3
+    :param poses: positions of the platform, p x 3
+    :param edges: ends of the obstacle edges, ... x e x 2 x 3
+    :param chain_edges: edges the cables wrap around, p x n x w, see get_wrap_chains
+    :param chain_points: separation points used as initial guess, p x n x w x 3
+    :return: shortest-path separation points over the same edges, p x ... x n x w x 3
+    """
+    batch = anchors.shape[:-2]
+    expand = (slice(None),) + (None,) * len(batch)
+    movable = (chain_edges >= 0)[expand][..., None]
+    wrap_count = (chain_edges != -1).sum(axis=-1)[expand][..., None]
+
+    # ends of the edge under every separation point, p x ... x n x w x 3
+    edge_ends = np.moveaxis(edges[..., np.clip(chain_edges, 0, None), :, :], len(batch), 0)
+    points = np.broadcast_to(chain_points[expand], edge_ends.shape[:-2] + (3,)).copy()
+    Bpoint = poses[expand][..., None, :]
+
+    wrap_num = chain_edges.shape[-1]
+    for _ in range(WRAP_ITERATIONS):
+        for j in range(wrap_num):
+            previous = anchors[None] if j == 0 else points[..., j - 1, :]
+            following = points[..., j + 1, :] if j + 1 < wrap_num else Bpoint
+            following = np.where(j + 1 < wrap_count, following, Bpoint)
+            solved = minimize_on_edge(previous, following, edge_ends[..., j, 0, :], edge_ends[..., j, 1, :])
+            points[..., j, :] = np.where(movable[..., j, :], solved, points[..., j, :])
+
+    return points
+
+
+def get_free_starts(anchors, chain_edges, points):
+    """
+    :return: fixed end of the free segment of every cable, the last separation point or the anchor
+    """
+    wrap_count = (chain_edges != -1).sum(axis=-1)
+    shape = points.shape[:-2]
+    last = np.broadcast_to(np.clip(wrap_count - 1, 0, None).reshape(
+        wrap_count.shape[:1] + (1,) * (len(shape) - 2) + wrap_count.shape[1:]), shape)
+    starts = np.take_along_axis(points, last[..., None, None], axis=-2)[..., 0, :]
+    wrapped = np.broadcast_to(wrap_count.reshape(last.shape[:1] + (1,) * (len(shape) - 2) + wrap_count.shape[1:]) > 0,
+                              shape)
+    return np.where(wrapped[..., None], starts, np.broadcast_to(anchors, starts.shape))
+
+
+def check_free_segments(starts, ends, scene, sample_num=100):
+    """
+    :param starts: fixed ends of the free cable segments, ... x 3
+    :param ends: platform positions, ... x 3
+    :return: whether each segment passes through the obstacle, same rule as collision_saw.check_collision
+    """
+    collision = np.zeros(np.broadcast_shapes(starts.shape, ends.shape)[:-1], dtype=bool)
+    for i in range(sample_num):
+        collision |= check_inside_batch(ends + (starts - ends) / sample_num * i, scene)
+    return collision
+
+
+def propagate_raw_uncertainty(poses, perturbations, t_min=0, t_max=50, m=1, scene=None,
+                              quantiles=(0.05, 0.5, 0.95)):
+    """
+    :param poses: positions of the platform, p x 3
+    :param perturbations: perturbed scenes, see sample_perturbations
+    :param t_min: minimum cable tension
+    :param t_max: maximum cable tension
+    :param m: nominal mass of the platform
+    :param scene: nominal scene built by scene.build_scene, the default scene if None
+    :param quantiles: quantiles of the raw to be returned
+    :return: dictionary with, for each pose, the nominal raw 'raw', the raw quantiles over the perturbed scenes
+             'quantiles' (p x q) and the probability 'p_infeasible' that the raw is not positive
+
+    Every perturbed scene is evaluated as collision_saw.evaluate_poses would: raw 0 with the platform inside the
+    obstacle, the plain raw where the straight cables are free and the wrapped raw where they collide. Where the
+    nominal cables are wrapped, the perturbed scenes keep the nominal wrapping, with the separation points
+    re-solved on the moved edges, so all scenes of a pose are evaluated as one batch. Only the samples whose
+    straight cables collide while the nominal ones do not are solved one by one with
+    collision_saw.calculate_wrapped_raw, those lie next to the collision boundary. The obstacle is the region of
+    collision_saw.check_inside for the nominal and the perturbed scenes alike, so that unperturbed scenes give the
+    nominal raw.
+    """
+    scene = build_scene() if scene is None else scene
+    poses = np.asarray(poses, dtype=float).reshape(-1, 3)
+    nominal_anchors = np.stack(scene['A_list'])
+    edges = get_obstacle_polyhedron(scene)[0]
+
+    anchors = nominal_anchors + perturbations['anchors']                 # k x n x 3
+    shifted_edges = edges + perturbations['obstacle'][:, None, None, :]  # k x e x 2 x 3
+    masses = perturbations['m']
+    wrenches = masses[:, None, None] * GRAVITY
+
+    nominal = evaluate_poses(poses, t_min, t_max, m, scene)
+    wrapped = nominal['collision'] & ~nominal['inside']
+
+    # the obstacle is the region of check_inside as in the nominal evaluation, moving it by d is moving the
+    # platform and the cables by -d
+    shift = perturbations['obstacle'][:, None, :]                        # k x 1 x 3
+    moved_poses = poses[:, None, :] - perturbations['obstacle']          # p x k x 3
+    inside = check_inside_batch(moved_poses, scene)
+    collision = np.any(check_free_segments(anchors - shift, moved_poses[:, :, None, :], scene), axis=-1)
+
+    vectors = anchors - poses[:, None, None, :]                          # p x k x n x 3
+    vectors = vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+    raw = calculate_static_raw(np.swapaxes(vectors, -1, -2), t_min, t_max, m, wrenches)      # p x k
+
+    if wrapped.any():
+        chain_edges, chain_points = get_wrap_chains([nominal['raw_separations'][index]
+                                                     for index in np.flatnonzero(wrapped)], edges)
+        # only the shift of the separation points is taken from the re-solved paths, so that unperturbed scenes
+        # reproduce the nominal solution exactly
+        resolved = solve_wraps(nominal_anchors, poses[wrapped], edges, chain_edges, chain_points)
+        shifted = solve_wraps(anchors, poses[wrapped], shifted_edges, chain_edges, resolved)
+        points = chain_points[:, None] + shifted - resolved[:, None]
+        starts = get_free_starts(anchors, chain_edges, points)             # w x k x n x 3
+        # the wrapped sweep uses the vectors to the separation points as they are
+        vectors = starts - poses[wrapped][:, None, None, :]
+        wrapped_raw = calculate_static_raw(np.swapaxes(vectors, -1, -2), t_min, t_max, m, wrenches)
+        raw[wrapped] = np.where(collision[wrapped], wrapped_raw, raw[wrapped])
+
+    for index, sample in zip(*np.nonzero(collision & ~inside & ~wrapped[:, None])):
+        perturbed = dict(scene, A_list=list(anchors[sample] - perturbations['obstacle'][sample]))
+        T, _ = get_symmetry(moved_poses[index, sample], perturbed)
+        raw[index, sample], _ = calculate_wrapped_raw(T @ moved_poses[index, sample], t_min, t_max, masses[sample],
+                                                      perturbed)
+    raw = np.where(inside, 0, raw)
+
+    return {'raw': nominal['raw'],
+            'quantiles': np.quantile(raw, quantiles, axis=-1).T,
+            'p_infeasible': np.mean(raw <= 0, axis=-1)}
+
+
+def propagate_block(positions, perturbations, limits, scene_config, quantiles):
+    return propagate_raw_uncertainty(positions, perturbations, limits['t_min'], limits['t_max'], limits['m'],
+                                     build_scene(scene_config), quantiles)
+
+
+def run_uncertainty_sweep(config, perturbations, quantiles=(0.05, 0.5, 0.95)):
+    """
+    :param config: sweep configuration, see scene.load_config, the mode is ignored and the scene should be the default
+    :param perturbations: perturbed scenes shared by every cell, see sample_perturbations
+    :return: dictionary with the nominal 'raw_matrix', the 'raw_quantiles' (x_num x y_num x z_num x q)
+             and the 'p_infeasible' of every cell
+    """
+    definition = get_definition(config)
+    check_default_scene(definition['scene'])
+    positions = get_positions(definition)
+    grid = positions.shape[:3]
+    positions = positions.reshape(-1, 3)
+
+    worker_num = config['workers'] or os.cpu_count()
+    block_size = max(SAMPLE_BUDGET // perturbations['m'].shape[0], 1)
+    block_num = max(-(-positions.shape[0] // block_size), 4 * worker_num)
+    blocks = np.array_split(positions, max(min(block_num, positions.shape[0]), 1))
+    task = partial(propagate_block, perturbations=perturbations, limits=definition['limits'],
+                   scene_config=definition['scene'], quantiles=quantiles)
+    if worker_num == 1:
+        results = [task(block) for block in blocks]
+    else:
+        with ProcessPoolExecutor(worker_num) as executor:
+            results = list(executor.map(task, blocks))
+
+    return {'raw_matrix': np.concatenate([r['raw'] for r in results]).reshape(grid),
+            'raw_quantiles': np.concatenate([r['quantiles'] for r in results]).reshape(grid + (len(quantiles),)),
+            'p_infeasible': np.concatenate([r['p_infeasible'] for r in results]).reshape(grid)}
+
+
+if __name__ == "__main__":
+    import scipy.io
+
+    parser = argparse.ArgumentParser(description='propagate placement and payload uncertainty to the raw map')
+    parser.add_argument('config', nargs='?', default=None, help='json file overriding the default configuration')
+    parser.add_argument('--grid', type=int, nargs=3, default=None, metavar=('X_NUM', 'Y_NUM', 'Z_NUM'))
+    parser.add_argument('--samples', type=int, default=256, help='number of perturbed scenes')
+    parser.add_argument('--anchor-std', type=float, default=0.001, help='anchor placement error (m)')
+    parser.add_argument('--obstacle-std', type=float, default=0.001, help='obstacle placement error (m)')
+    parser.add_argument('--mass-range', type=float, nargs=2, default=None, help='payload range, nominal mass if None')
+    parser.add_argument('--quantiles', type=float, nargs='+', default=[0.05, 0.5, 0.95])
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='raw_uncertainty.mat')
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    for key in ('grid', 'workers'):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    m = config['limits']['m']
+    perturbations = sample_perturbations(args.samples, args.anchor_std, args.obstacle_std,
+                                         args.mass_range or (m, m), len(config['scene']['anchors']), args.seed)
+    result = run_uncertainty_sweep(config, perturbations, tuple(args.quantiles))
+    result['quantiles'] = np.array(args.quantiles)
+    scipy.io.savemat(args.output, result)
+    print(args.output)